@@ -1,8 +1,5 @@
 from __future__ import annotations
 
-import os
-from importlib import reload
-
 from fastapi import FastAPI
 
 from .settings import Settings
@@ -10,14 +7,9 @@ from .settings import Settings
 
 def create_app(config: Settings) -> FastAPI:
     """Create a FastAPI app instance configured with provided settings."""
-    os.environ["DB_PATH"] = config.db_path
-    os.environ["CACHE_DB_PATH"] = config.cache_db_path
-
-    from apps.api import main as main_module
+    from apps.api.main import create_app as _create_app
 
-    reload(main_module)
-    return main_module.app
+    return _create_app(config)
 
 
 __all__ = ["create_app"]
-
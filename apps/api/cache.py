@@ -2,103 +2,437 @@
 
 from __future__ import annotations
 
-import json
+import hashlib
+import math
+import mmap
+import os
+import queue
 import sqlite3
+import struct
+import threading
 import time
-from typing import Any, Dict, List, Optional, Tuple
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+import orjson
 
 from apps.api.settings import settings
 from logger import logger
 
+SECONDS_PER_DAY = 24 * 3600
+
+# The key is the table's B-tree, so lookups avoid a separate rowid index.
+_CACHE_TABLE_DDL = """
+CREATE TABLE {name} (
+  key TEXT PRIMARY KEY,
+  value BLOB NOT NULL,
+  expire_ts REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+# Statement text is kept constant so sqlite3's per-connection statement
+# cache reuses the prepared statements.
+_SQL_GET = "SELECT value, expire_ts FROM cache WHERE key = ? AND expire_ts > ?"
+_SQL_SET = "INSERT OR REPLACE INTO cache (key, value, expire_ts) VALUES (?, ?, ?)"
+_SQL_CLEANUP = "DELETE FROM cache WHERE expire_ts < ?"
+
+_ZLIB_HEADER = b"\x78"
+
+_STOP = object()
+
+
+class _Miss(Exception):
+    """Raised by ``CacheManager._get_uncached``; ``lru_cache`` does not store exceptions."""
+
+
+def payload_etag(payload: bytes) -> str:
+    """Strong ETag for a serialized response body."""
+    return '"%s"' % hashlib.blake2b(payload, digest_size=8).hexdigest()
+
+
+class CachedPayload(NamedTuple):
+    """An encoded response with the ETag and wall-clock expiry it was stored with."""
+
+    body: bytes
+    etag: str
+    expire_ts: float
+
+    @classmethod
+    def build(cls, body: bytes, expire_ts: float) -> CachedPayload:
+        return cls(body, payload_etag(body), expire_ts)
+
+    def max_age(self) -> int:
+        """Seconds a client may reuse the response before it expires here."""
+        return max(0, int(self.expire_ts - time.time()))
+
+
+@lru_cache(maxsize=4096)
+def _intents_key(intents: Tuple[str, ...]) -> str:
+    """Canonical, order-independent form of an intents list for cache keys."""
+    return ",".join(sorted(intents))
+
 
 class MemoryTTLCache:
-    """Simple in-memory cache with per-key TTL."""
+    """In-memory LRU cache with per-key TTL and a bounded number of entries.
+
+    Expiry is tracked on the monotonic clock, so wall-clock adjustments do
+    not expire or resurrect entries.
+    """
 
-    def __init__(self, default_ttl_days: int = 7) -> None:
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, default_ttl_days: int = 7, max_entries: int = 10_000) -> None:
+        self.cache: OrderedDict[str, Tuple[Any, float]] = OrderedDict()
         self.default_ttl_days = default_ttl_days
+        self.max_entries = max_entries
+        self._default_ttl_seconds = default_ttl_days * SECONDS_PER_DAY
 
     def get(self, key: str) -> Optional[Any]:
-        if key not in self.cache:
+        entry = self.cache.get(key)
+        if entry is None:
             return None
-        entry = self.cache[key]
-        if time.time() > entry["expire_ts"]:
-            del self.cache[key]
+        value, expire_ts = entry
+        if time.monotonic() > expire_ts:
+            self.cache.pop(key, None)
             return None
-        return entry["value"]
+        try:
+            self.cache.move_to_end(key)
+        except KeyError:
+            # Evicted by a concurrent writer since the lookup above.
+            pass
+        return value
 
     def set(self, key: str, value: Any, ttl_days: Optional[int] = None) -> None:
-        ttl = ttl_days or self.default_ttl_days
-        expire_ts = time.time() + ttl * 24 * 3600
-        self.cache[key] = {"value": value, "expire_ts": expire_ts}
+        ttl_seconds = ttl_days * SECONDS_PER_DAY if ttl_days else self._default_ttl_seconds
+        self.cache[key] = (value, time.monotonic() + ttl_seconds)
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.max_entries:
+            self.cache.popitem(last=False)
+
+    def most_recent(self, limit: int) -> List[Tuple[str, Any, float]]:
+        """Return up to ``limit`` live ``(key, value, ttl_seconds)`` entries, most recently used last."""
+        now = time.monotonic()
+        entries = list(self.cache.items())[-limit:]
+        return [(key, value, expire_ts - now) for key, (value, expire_ts) in entries if expire_ts > now]
+
+
+class SnapshotCache:
+    """Read-only pack of cache entries served straight from an ``mmap``.
+
+    The file holds a header, an index of fixed-size records sorted by key
+    digest, and the concatenated payloads, so a lookup is a binary search
+    over the index and a slice of the mapping. Packs are rebuilt with
+    ``write`` and swapped in with ``reload``.
+    """
+
+    MAGIC = b"EPK1"
+    _HEADER = struct.Struct("<4sI")
+    # key digest, wall-clock expiry, payload offset, payload length
+    _RECORD = struct.Struct("<16sdII")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._mm: Optional[mmap.mmap] = None
+        self._count = 0
+        self.reload()
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    @classmethod
+    def write(cls, path: str, items: Iterable[Tuple[str, bytes, float]]) -> int:
+        """Atomically replace the pack at ``path`` with ``(key, payload, expire_ts)`` items."""
+        records = sorted((cls._digest(key), payload, expire_ts) for key, payload, expire_ts in items)
+        offset = cls._HEADER.size + cls._RECORD.size * len(records)
+        index = []
+        for digest, payload, expire_ts in records:
+            index.append(cls._RECORD.pack(digest, expire_ts, offset, len(payload)))
+            offset += len(payload)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(cls._HEADER.pack(cls.MAGIC, len(records)))
+            f.writelines(index)
+            f.writelines(payload for _, payload, _ in records)
+        os.replace(tmp_path, path)
+        return len(records)
+
+    def reload(self) -> None:
+        """Map the current pack file, if there is a valid one."""
+        try:
+            with open(self.path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return
+        try:
+            magic, count = self._HEADER.unpack_from(mm)
+            if magic == self.MAGIC and len(mm) < self._HEADER.size + count * self._RECORD.size:
+                raise ValueError("index runs past the end of the file")
+        except (struct.error, ValueError) as e:
+            # A truncated or partly written pack is treated like a missing one.
+            logger.warning("SnapshotCache: ignoring %s, truncated: %s", self.path, e)
+            mm.close()
+            return
+        if magic != self.MAGIC:
+            logger.warning("SnapshotCache: ignoring %s, unknown format", self.path)
+            mm.close()
+            return
+        # The previous mapping is left to the garbage collector so that
+        # concurrent readers holding a reference to it are unaffected.
+        self._mm, self._count = mm, count
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return ``(payload, expire_ts)`` for ``key`` if it has not expired."""
+        mm = self._mm
+        if mm is None:
+            return None
+        digest = self._digest(key)
+        base, size = self._HEADER.size, self._RECORD.size
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = base + mid * size
+            probe = mm[pos:pos + 16]
+            if probe < digest:
+                lo = mid + 1
+            elif probe > digest:
+                hi = mid
+            else:
+                _, expire_ts, offset, length = self._RECORD.unpack_from(mm, pos)
+                if expire_ts <= time.time():
+                    return None
+                return mm[offset:offset + length], expire_ts
+        return None
+
+    def close(self) -> None:
+        self._mm = None
+        self._count = 0
 
 
 class SQLiteCache:
-    """SQLite-backed cache with TTL support."""
+    """SQLite-backed cache with TTL support.
+
+    A single long-lived connection is shared by all operations; access is
+    serialized with a lock so the cache can be used from FastAPI's threadpool.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-64000",
+        "PRAGMA mmap_size=30000000000",
+    )
+
+    # Payloads at least this large are zlib-compressed before being stored.
+    COMPRESS_MIN_BYTES = 1024
+    COMPRESS_LEVEL = 3
 
     def __init__(self, db_path: str) -> None:
         self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path,
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
+        for pragma in self.PRAGMAS:
+            self._conn.execute(pragma)
         self._ensure_schema()
 
     def _ensure_schema(self) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS cache (
-                  key TEXT PRIMARY KEY,
-                  value TEXT NOT NULL,
-                  expire_ts REAL NOT NULL
-                );
-                """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'cache'"
+            ).fetchone()
+            if row is None:
+                self._conn.execute(_CACHE_TABLE_DDL.format(name="cache"))
+            elif "WITHOUT ROWID" not in row[0].upper():
+                self._migrate_to_without_rowid()
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_expire ON cache(expire_ts)"
             )
-            conn.commit()
 
-    def get(self, key: str) -> Optional[Any]:
-        now = time.time()
-        with sqlite3.connect(self.db_path) as conn:
-            row = conn.execute(
-                "SELECT value, expire_ts FROM cache WHERE key = ?",
-                (key,),
-            ).fetchone()
-        if not row:
-            return None
-        value_json, expire_ts = row
-        if now > float(expire_ts):
-            return None
+    def _migrate_to_without_rowid(self) -> None:
+        """Rebuild a legacy rowid ``cache`` table as a WITHOUT ROWID table."""
+        self._conn.execute("BEGIN IMMEDIATE")
         try:
-            return json.loads(value_json)
+            self._conn.execute(_CACHE_TABLE_DDL.format(name="cache_new"))
+            self._conn.execute(
+                "INSERT INTO cache_new (key, value, expire_ts) "
+                "SELECT key, value, expire_ts FROM cache"
+            )
+            self._conn.execute("DROP TABLE cache")
+            self._conn.execute("ALTER TABLE cache_new RENAME TO cache")
         except Exception:
-            logger.warning("SQLiteCache: failed to decode JSON for key=%s", key)
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        logger.info("SQLiteCache: migrated cache table to WITHOUT ROWID")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the stored JSON payload for ``key`` if it has not expired."""
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key: str) -> Optional[Tuple[bytes, float]]:
+        """Return ``(payload, expire_ts)`` for ``key`` if it has not expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(_SQL_GET, (key, now)).fetchone()
+        if not row:
             return None
+        payload, expire_ts = row
+        # Rows written before values were stored as BLOBs come back as text.
+        if isinstance(payload, str):
+            return payload.encode(), expire_ts
+        # A JSON document never starts with the zlib header byte.
+        if payload[:1] == _ZLIB_HEADER:
+            return zlib.decompress(payload), expire_ts
+        return payload, expire_ts
 
-    def set(self, key: str, value: Any, ttl_days: int = 7) -> None:
-        expire_ts = time.time() + ttl_days * 24 * 3600
-        payload = json.dumps(value, ensure_ascii=False)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT OR REPLACE INTO cache (key, value, expire_ts) VALUES (?, ?, ?)",
-                (key, payload, expire_ts),
-            )
-            conn.commit()
+    def set(self, key: str, payload: bytes, ttl_days: int = 7) -> None:
+        self.set_many([(key, payload, ttl_days)])
+
+    def set_many(self, items: Iterable[Tuple[str, bytes, int]]) -> None:
+        """Write several JSON payloads in a single transaction."""
+        now = time.time()
+        rows = [
+            (key, self._compress(payload), now + ttl_days * SECONDS_PER_DAY)
+            for key, payload, ttl_days in items
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(_SQL_SET, rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _compress(self, payload: bytes) -> bytes:
+        if len(payload) < self.COMPRESS_MIN_BYTES:
+            return payload
+        return zlib.compress(payload, self.COMPRESS_LEVEL)
 
     def cleanup(self) -> int:
         now = time.time()
-        with sqlite3.connect(self.db_path) as conn:
-            cur = conn.execute("DELETE FROM cache WHERE expire_ts < ?", (now,))
-            conn.commit()
+        with self._lock:
+            cur = self._conn.execute(_SQL_CLEANUP, (now,))
             return cur.rowcount
 
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
 
 class CacheManager:
-    """High-level two-layer cache manager."""
+    """High-level two-layer cache manager.
+
+    Values are serialized to JSON once on ``set`` and both layers hold the
+    encoded bytes, so a hit can be returned to the client without
+    re-serializing. Hits are returned as ``CachedPayload`` with the ETag
+    computed when the entry entered the memory layer. Writes hit the memory
+    layer synchronously and are persisted to SQLite by a background writer
+    that batches queued entries into one transaction.
+    """
+
+    # Coordinates are bucketed to 1/1000 degree (~110 m) so nearby requests
+    # share a cache entry.
+    COORD_BUCKETS_PER_DEGREE = 1000
+    # Repeated lookups of a key within the same HOT_WINDOW_S-second window
+    # are answered from a small LRU in front of both layers.
+    HOT_KEYS = 1024
+    HOT_WINDOW_S = 5
+    WRITE_BATCH_SIZE = 128
+    GC_INTERVAL_S = 600
+    WRITE_BATCH_WINDOW_S = 0.02
+    # Number of most recently used keys written to the snapshot pack.
+    SNAPSHOT_KEYS = 1024
 
     def __init__(
         self,
         memory_ttl_days: int = 7,
         sqlite_db_path: Optional[str] = None,
+        snapshot_path: Optional[str] = None,
     ) -> None:
         self.memory = MemoryTTLCache(default_ttl_days=memory_ttl_days)
         self.sqlite = SQLiteCache(sqlite_db_path or settings.cache_db_path)
+        self.snapshot = SnapshotCache(snapshot_path) if snapshot_path else None
+        self._hot_get = lru_cache(maxsize=self.HOT_KEYS)(self._get_uncached)
+        self._writeq: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._drain, name="cache-writer", daemon=True)
+        self._writer.start()
+        self._stopped = threading.Event()
+        self._gc = threading.Thread(target=self._gc_loop, name="cache-gc", daemon=True)
+        self._gc.start()
+
+    def _gc_loop(self) -> None:
+        """Periodically drop expired SQLite entries off the request path."""
+        while not self._stopped.wait(self.GC_INTERVAL_S):
+            try:
+                removed = self.sqlite.cleanup()
+            except Exception:
+                logger.exception("CacheManager: expired-entry cleanup failed")
+                continue
+            if removed:
+                logger.info("CacheManager: removed %d expired cache entries", removed)
+            if self.snapshot is not None:
+                try:
+                    self.write_snapshot()
+                except Exception:
+                    logger.exception("CacheManager: snapshot rebuild failed")
+
+    def write_snapshot(self) -> int:
+        """Rewrite the snapshot pack from the most recently used memory entries."""
+        if self.snapshot is None:
+            return 0
+        count = SnapshotCache.write(
+            self.snapshot.path,
+            (
+                (key, entry.body, entry.expire_ts)
+                for key, entry, _ in self.memory.most_recent(self.SNAPSHOT_KEYS)
+            ),
+        )
+        self.snapshot.reload()
+        return count
+
+    def _drain(self) -> None:
+        """Background loop persisting queued writes in batches."""
+        running = True
+        while running:
+            batch: List[Tuple[str, bytes, int]] = []
+            waiters: List[threading.Event] = []
+            item = self._writeq.get()
+            deadline = time.monotonic() + self.WRITE_BATCH_WINDOW_S
+            while True:
+                if item is _STOP:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if not running or len(batch) >= self.WRITE_BATCH_SIZE:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._writeq.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.sqlite.set_many(batch)
+                except Exception:
+                    logger.exception("CacheManager: failed to persist %d entries", len(batch))
+            for waiter in waiters:
+                waiter.set()
 
     def build_cache_key(
         self,
@@ -109,28 +443,78 @@ class CacheManager:
         lat: float,
         lng: float,
     ) -> str:
-        intents_part = ",".join(sorted(intents))
-        return (
-            f"rec:{city.lower()}:{day}:{vibe.lower()}:{intents_part}:{round(lat,6)}:{round(lng,6)}"
+        return "rec:%s:%s:%s:%s:%d:%d" % (
+            city.lower(),
+            day,
+            vibe.lower(),
+            _intents_key(tuple(intents)),
+            math.floor(lat * self.COORD_BUCKETS_PER_DEGREE),
+            math.floor(lng * self.COORD_BUCKETS_PER_DEGREE),
         )
 
-    def get(self, key: str) -> Tuple[Optional[Any], str, str]:
+    def get(self, key: str) -> Tuple[Optional[CachedPayload], str, str]:
+        try:
+            return self._hot_get(key, int(time.monotonic()) // self.HOT_WINDOW_S)
+        except _Miss:
+            return None, "MISS", "-"
+
+    def _get_uncached(self, key: str, epoch: int) -> Tuple[CachedPayload, str, str]:
+        # ``epoch`` only partitions the hot-key LRU into HOT_WINDOW_S slices.
+        # Misses raise so that only hits are memoized; a miss stored while
+        # ``set_payload`` clears the LRU would otherwise hide the new entry.
         val = self.memory.get(key)
         if val is not None:
             return val, "HIT", "memory"
-        val = self.sqlite.get(key)
-        if val is not None:
+        if self.snapshot is not None:
+            stored = self.snapshot.get_entry(key)
+            if stored is not None:
+                val = CachedPayload.build(*stored)
+                self.memory.set(key, val)
+                return val, "HIT", "snapshot"
+        try:
+            stored = self.sqlite.get_entry(key)
+        except sqlite3.OperationalError:
+            # A locked or busy cache database degrades to a miss.
+            logger.warning("CacheManager: sqlite lookup failed for %s", key, exc_info=True)
+            raise _Miss
+        if stored is not None:
+            val = CachedPayload.build(*stored)
             self.memory.set(key, val)
             return val, "HIT", "sqlite"
-        return None, "MISS", "-"
+        raise _Miss
 
     def set(self, key: str, value: Any, ttl_days: int = 7) -> None:
-        self.memory.set(key, value, ttl_days=ttl_days)
-        self.sqlite.set(key, value, ttl_days=ttl_days)
+        self.set_payload(key, orjson.dumps(value), ttl_days=ttl_days)
+
+    def set_payload(self, key: str, payload: bytes, ttl_days: int = 7) -> CachedPayload:
+        """Store an already JSON-encoded value and return it as cached."""
+        entry = CachedPayload.build(payload, time.time() + ttl_days * SECONDS_PER_DAY)
+        self.memory.set(key, entry, ttl_days=ttl_days)
+        self._hot_get.cache_clear()
+        self._writeq.put((key, payload, ttl_days))
+        return entry
+
+    def flush(self) -> None:
+        """Block until every queued write has been persisted."""
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._writeq.put(done)
+        done.wait()
 
     def cleanup(self) -> int:
         return self.sqlite.cleanup()
 
+    def close(self) -> None:
+        self._stopped.set()
+        self._gc.join()
+        if self._writer.is_alive():
+            self._writeq.put(_STOP)
+            self._writer.join()
+        self.sqlite.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+
 
-__all__ = ["MemoryTTLCache", "SQLiteCache", "CacheManager"]
+__all__ = ["CachedPayload", "payload_etag", "MemoryTTLCache", "SnapshotCache", "SQLiteCache", "CacheManager"]
 
@@ -0,0 +1,58 @@
+"""Long-lived SQLite connections for the API."""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from typing import List
+
+
+class ConnectionPool:
+    """One autocommit connection per thread to a single database.
+
+    Connections are opened lazily on first use and kept for the life of the
+    process, so SQLite's page cache and prepared statements survive across
+    requests. Rows come back as ``sqlite3.Row`` so callers can use column
+    names.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-64000",
+        "PRAGMA mmap_size=268435456",
+    )
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: List[sqlite3.Connection] = []
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                isolation_level=None,
+                cached_statements=256,
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in self.PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
+
+
+__all__ = ["ConnectionPool"]
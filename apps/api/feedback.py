@@ -0,0 +1,115 @@
+"""Batched persistence of route feedback."""
+
+from __future__ import annotations
+
+import queue
+import sqlite3
+import threading
+from typing import Any, List, Optional, Tuple
+
+from logger import logger
+
+_SQL_INSERT = "INSERT INTO feedback (created_at, route_json, useful, note) VALUES (?, ?, ?, ?)"
+
+_STOP = object()
+
+FeedbackRow = Tuple[str, str, bool, Optional[str]]
+
+
+class _Pending:
+    __slots__ = ("row", "done", "id", "error")
+
+    def __init__(self, row: FeedbackRow) -> None:
+        self.row = row
+        self.done = threading.Event()
+        self.id: Optional[int] = None
+        self.error: Optional[BaseException] = None
+
+
+class FeedbackWriter:
+    """Group-commits feedback rows from a single background writer thread.
+
+    ``submit`` blocks until its row is committed and returns the row id.
+    Rows that arrive while a batch is being written are committed together
+    in the next transaction, so concurrent submissions share one commit.
+    After ``close`` it raises ``RuntimeError`` instead of waiting.
+    """
+
+    BATCH_SIZE = 100
+
+    def __init__(self, db_path: str) -> None:
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._queue: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        # Guards ``_closed`` so no row is queued behind the stop marker
+        self._lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._drain, name="feedback-writer", daemon=True)
+        self._writer.start()
+
+    def submit(self, row: FeedbackRow) -> int:
+        """Persist ``(created_at, route_json, useful, note)`` and return its id."""
+        pending = _Pending(row)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("FeedbackWriter is closed")
+            self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        assert pending.id is not None
+        return pending.id
+
+    def _drain(self) -> None:
+        running = True
+        while running:
+            batch: List[_Pending] = []
+            item = self._queue.get()
+            while True:
+                if item is _STOP:
+                    running = False
+                else:
+                    batch.append(item)
+                if not running or len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[_Pending]) -> None:
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(_SQL_INSERT, [pending.row for pending in batch])
+                last_id = self._conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        except Exception as e:
+            logger.exception("FeedbackWriter: failed to persist %d rows", len(batch))
+            for pending in batch:
+                pending.error = e
+                pending.done.set()
+            return
+        # The write lock is held for the whole transaction and ids are
+        # AUTOINCREMENT, so the batch received consecutive ids.
+        first_id = last_id - len(batch) + 1
+        for offset, pending in enumerate(batch):
+            pending.id = first_id + offset
+            pending.done.set()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._writer.join()
+        self._conn.close()
+
+
+__all__ = ["FeedbackWriter"]
@@ -0,0 +1,76 @@
+"""Great-circle distance helpers."""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+EARTH_RADIUS_M = 6371000
+
+
+def to_radians(
+    lats: Sequence[float],
+    lngs: Sequence[float],
+) -> Tuple[List[float], List[float], List[float]]:
+    """Return ``(lat_rad, lng_rad, cos(lat_rad))`` lists for ``haversine_rad``."""
+    lat_rs = [math.radians(lat) for lat in lats]
+    lng_rs = [math.radians(lng) for lng in lngs]
+    return lat_rs, lng_rs, [math.cos(lat_r) for lat_r in lat_rs]
+
+
+def haversine_rad(
+    lat_r: float,
+    lng_r: float,
+    cos_lat: float,
+    lat_rs: Sequence[float],
+    lng_rs: Sequence[float],
+    cos_lats: Sequence[float],
+) -> List[float]:
+    """Distances in meters from one point to many, all given in radians.
+
+    Callers computing distances repeatedly over the same points convert
+    them once with ``to_radians`` so no ``radians``/``cos`` is repeated.
+    """
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    diameter = 2 * EARTH_RADIUS_M
+    return [
+        diameter * asin(sqrt(sin((lat2_r - lat_r) / 2) ** 2 + cos_lat * cos_lat2 * sin((lng2_r - lng_r) / 2) ** 2))
+        for lat2_r, lng2_r, cos_lat2 in zip(lat_rs, lng_rs, cos_lats)
+    ]
+
+
+class PlaceCoords:
+    """Place coordinates in radians, keyed by place id.
+
+    Loaded once at startup so route building does not convert the same
+    coordinates on every request. Each entry keeps the degrees it was
+    converted from; places missing from the table (e.g. ingested after
+    startup) or whose fetched lat/lng no longer match are converted again.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, float, float]]) -> None:
+        self._by_id: Dict[int, Tuple[float, float, float, float, float]] = {}
+        for place_id, lat, lng in rows:
+            self._by_id[place_id] = self._convert(lat, lng)
+
+    @staticmethod
+    def _convert(lat: float, lng: float) -> Tuple[float, float, float, float, float]:
+        lat_r = math.radians(lat)
+        return (lat, lng, lat_r, math.radians(lng), math.cos(lat_r))
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def lookup(self, places: Sequence[Mapping[str, Any]]) -> Tuple[List[float], List[float], List[float]]:
+        """Return ``to_radians``-style lists for ``places`` in order"""
+        lat_rs, lng_rs, cos_lats = [], [], []
+        by_id = self._by_id
+        for place in places:
+            lat, lng = place['lat'], place['lng']
+            coords = by_id.get(place['id'])
+            if coords is None or coords[0] != lat or coords[1] != lng:
+                coords = by_id[place['id']] = self._convert(lat, lng)
+            lat_rs.append(coords[2])
+            lng_rs.append(coords[3])
+            cos_lats.append(coords[4])
+        return lat_rs, lng_rs, cos_lats
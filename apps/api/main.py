@@ -1,40 +1,37 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import contextlib
 import math
 import sqlite3
 import time
-from datetime import datetime
+from bisect import bisect_left, bisect_right
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from datetime import time as dt_time
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, cast  # noqa: F401
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple, cast  # noqa: F401
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+import orjson
+from fastapi import APIRouter, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 
-from apps.api.settings import settings
-from apps.ingest.db_init import init_clean_db, seed_mock_data
+from apps.api.settings import Settings, settings
+from apps.ingest.db_init import FEEDBACK_TABLE_DDL, init_clean_db, seed_mock_data
 from logger import logger
-from packages.search.provider import LocalSearchProvider
+from packages.search.provider import LocalSearchProvider, reciprocal_rank_fusion
 
 from .cache import CacheManager
+from .db import ConnectionPool
+from .feedback import FeedbackWriter
+from .geo import PlaceCoords, haversine_rad, to_radians
 from .middleware import TimingMiddleware, log_operation
 
-app = FastAPI(title="Entertainment Planner API")
+router = APIRouter()
 
-# Add timing middleware
-app.add_middleware(TimingMiddleware)
-
-# Ensure database exists with seed data
-db_file = Path(settings.db_path)
-if not db_file.exists():
-    db_file.parent.mkdir(parents=True, exist_ok=True)
-    init_clean_db(db_file)
-    seed_mock_data(db_file)
-
-# Initialize search provider and cache manager
-search_provider = LocalSearchProvider(settings.db_path)
-cache_manager = CacheManager(sqlite_db_path=settings.db_path)
+# Candidates kept after merging FTS and KNN results.
+MAX_CANDIDATES = 20
 
 # Feedback model
 class FeedbackRequest(BaseModel):
@@ -42,37 +39,39 @@ class FeedbackRequest(BaseModel):
     useful: bool
     note: Optional[str] = None
 
-def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Calculate distance between two points in meters"""
-    R = 6371000  # Earth's radius in meters
-    
-    lat1_rad = math.radians(lat1)
-    lng1_rad = math.radians(lng1)
-    lat2_rad = math.radians(lat2)
-    lng2_rad = math.radians(lng2)
-    
-    dlat = lat2_rad - lat1_rad
-    dlng = lng2_rad - lng1_rad
-    
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlng/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    
-    return R * c
-
-def get_place_by_id(place_id: int) -> Optional[Dict[str, Any]]:
+# (local date string, timestamp of the next local midnight)
+_today: Tuple[str, float] = ("", 0.0)
+
+def today_str() -> str:
+    """Current local date as YYYY-MM-DD, reformatted only when the day changes"""
+    global _today
+    now = time.time()
+    if now >= _today[1]:
+        today = datetime.fromtimestamp(now).date()
+        next_midnight = datetime.combine(today + timedelta(days=1), dt_time.min).timestamp()
+        _today = (today.strftime("%Y-%m-%d"), next_midnight)
+    return _today[0]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already covers ``etag``"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return any(tag.strip() in (etag, "*") for tag in header.split(","))
+
+def get_place_by_id(place_id: int, conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
     """Fetch place by ID from clean.places"""
     try:
-        with sqlite3.connect(settings.db_path) as conn:
-            cursor = conn.cursor()
+        cursor = conn.cursor()
 
-            cursor.execute('''
-                SELECT id, name, summary_160, full_description, lat, lng, district, city,
-                       price_level, rating, ratings_count, hours_json, phone, site,
-                       gmap_url, photos_json, tags_json, vibe_json, quality_score
-                FROM places WHERE id = ?
-            ''', (place_id,))
+        cursor.execute('''
+            SELECT id, name, summary_160, full_description, lat, lng, district, city,
+                   price_level, rating, ratings_count, hours_json, phone, site,
+                   gmap_url, photos_json, tags_json, vibe_json, quality_score
+            FROM places WHERE id = ?
+        ''', (place_id,))
 
-            row = cursor.fetchone()
+        row = cursor.fetchone()
 
         if row:
             return {
@@ -87,13 +86,13 @@ def get_place_by_id(place_id: int) -> Optional[Dict[str, Any]]:
                 'price_level': row[8],
                 'rating': row[9],
                 'ratings_count': row[10],
-                'hours_json': json.loads(row[11]) if row[11] else None,
+                'hours_json': orjson.loads(row[11]) if row[11] else None,
                 'phone': row[12],
                 'site': row[13],
                 'gmap_url': row[14],
-                'photos_json': json.loads(row[15]) if row[15] else None,
-                'tags_json': json.loads(row[16]) if row[16] else None,
-                'vibe_json': json.loads(row[17]) if row[17] else None,
+                'photos_json': orjson.loads(row[15]) if row[15] else None,
+                'tags_json': orjson.loads(row[16]) if row[16] else None,
+                'vibe_json': orjson.loads(row[17]) if row[17] else None,
                 'quality_score': row[18]
             }
         return None
@@ -102,62 +101,118 @@ def get_place_by_id(place_id: int) -> Optional[Dict[str, Any]]:
         logger.error(f"Error fetching place {place_id}: {e}")
         return None
 
+# Candidates are looked up through json_each so the statement text is the
+# same for any number of ids, and come back in the order of the id list.
+# Fewer than three ids are topped up with the first places in the table so a
+# route can still be built.
+_CANDIDATE_COLUMNS = '''
+    SELECT places.id, name, summary_160, lat, lng, district, rating,
+           tags_json, vibe_json, quality_score
+'''
+_CANDIDATES_SQL = _CANDIDATE_COLUMNS + '''
+    FROM json_each(?) AS ranked JOIN places ON places.id = ranked.value
+    ORDER BY ranked.key
+'''
+_CANDIDATES_TOPUP_SQL = _CANDIDATE_COLUMNS + '''
+    FROM places LEFT JOIN json_each(?) AS ranked ON places.id = ranked.value
+    WHERE ranked.key IS NOT NULL OR places.id IN (SELECT id FROM places LIMIT 3)
+    ORDER BY ranked.key IS NULL, ranked.key, places.id
+'''
+
+def fetch_candidates(conn: sqlite3.Connection, ids: List[int]) -> List[Dict[str, Any]]:
+    """Load the place rows used for route building in one query, in ``ids`` order"""
+    sql = _CANDIDATES_TOPUP_SQL if len(ids) < 3 else _CANDIDATES_SQL
+    candidates = []
+    for row in conn.execute(sql, (orjson.dumps(ids).decode(),)):
+        candidate = dict(row)
+        candidate['tags_json'] = orjson.loads(row['tags_json']) if row['tags_json'] else []
+        candidate['vibe_json'] = orjson.loads(row['vibe_json']) if row['vibe_json'] else {}
+        candidate['tags_lc'] = frozenset(tag.lower() for tag in candidate['tags_json'])
+        candidates.append(candidate)
+    return candidates
+
 def build_route(
     candidates: List[Dict[str, Any]],
     start_lat: float,
     start_lng: float,
     min_distance: float = 300,
     max_distance: float = 1200,
+    coords: Optional[PlaceCoords] = None,
 ) -> Optional[Dict[str, Any]]:
     """Build 3-step route using greedy approach by geo proximity"""
     if len(candidates) < 3:
         return None
     
-    # Sort candidates by distance from start point
-    for candidate in candidates:
-        candidate['distance_from_start'] = haversine_distance(
-            start_lat, start_lng, candidate['lat'], candidate['lng']
+    # Convert coordinates once (or take them from the startup table);
+    # every distance below reuses them
+    if coords is not None:
+        lat_rs, lng_rs, cos_lats = coords.lookup(candidates)
+    else:
+        lat_rs, lng_rs, cos_lats = to_radians(
+            [c['lat'] for c in candidates], [c['lng'] for c in candidates]
         )
+    start_lat_r = math.radians(start_lat)
+    start_distances = haversine_rad(
+        start_lat_r, math.radians(start_lng), math.cos(start_lat_r), lat_rs, lng_rs, cos_lats
+    )
     
-    candidates.sort(key=lambda x: x['distance_from_start'])
+    # Sort candidates by distance from start point
+    order = sorted(range(len(candidates)), key=start_distances.__getitem__)
+    candidates[:] = [candidates[i] for i in order]
+    lat_rs = [lat_rs[i] for i in order]
+    lng_rs = [lng_rs[i] for i in order]
+    cos_lats = [cos_lats[i] for i in order]
+    sorted_start = [start_distances[i] for i in order]
+    for candidate, distance in zip(candidates, sorted_start):
+        candidate['distance_from_start'] = distance
     
     # Select first place (closest to start)
     route = [candidates[0]]
-    current_lat, current_lng = candidates[0]['lat'], candidates[0]['lng']
+    route_ids = {candidates[0]['id']}
+    current = 0
+    total_distance: float = 0.0
     
     # Find next 2 places within distance constraints
     for _ in range(2):
-        best_next = None
+        best_index: Optional[int] = None
         best_distance = float('inf')
         
-        for candidate in candidates:
-            if candidate['id'] in [p['id'] for p in route]:
+        # By the triangle inequality a place within max_distance of the
+        # current one is also within max_distance of its distance from the
+        # start, so only that window of the sorted candidates is scanned
+        # (with 1 m of slack for rounding).
+        lo = bisect_left(sorted_start, sorted_start[current] - max_distance - 1)
+        hi = bisect_right(sorted_start, sorted_start[current] + max_distance + 1)
+        distances = haversine_rad(
+            lat_rs[current], lng_rs[current], cos_lats[current],
+            lat_rs[lo:hi], lng_rs[lo:hi], cos_lats[lo:hi],
+        )
+        for i, distance in enumerate(distances, start=lo):
+            if candidates[i]['id'] in route_ids:
                 continue
-                
-            distance = haversine_distance(current_lat, current_lng, candidate['lat'], candidate['lng'])
             
             if min_distance <= distance <= max_distance and distance < best_distance:
-                best_next = candidate
+                best_index = i
                 best_distance = distance
         
-        if best_next:
-            route.append(best_next)
-            current_lat, current_lng = best_next['lat'], best_next['lng']
-        else:
+        if best_index is None:
             # If no place in range, pick closest one
-            for candidate in candidates:
-                if candidate['id'] not in [p['id'] for p in route]:
-                    route.append(candidate)
-                    current_lat, current_lng = candidate['lat'], candidate['lng']
+            for i, candidate in enumerate(candidates):
+                if candidate['id'] not in route_ids:
+                    best_index = i
                     break
-    
-    # Calculate total distance
-    total_distance: float = 0.0
-    for i in range(len(route) - 1):
-        total_distance += haversine_distance(
-            route[i]['lat'], route[i]['lng'],
-            route[i+1]['lat'], route[i+1]['lng']
-        )
+            if best_index is None:
+                continue
+            best_distance = haversine_rad(
+                lat_rs[current], lng_rs[current], cos_lats[current],
+                lat_rs[best_index:best_index + 1], lng_rs[best_index:best_index + 1],
+                cos_lats[best_index:best_index + 1],
+            )[0]
+        
+        route.append(candidates[best_index])
+        route_ids.add(candidates[best_index]['id'])
+        total_distance += best_distance
+        current = best_index
     
     return {
         'steps': [place['id'] for place in route],
@@ -167,26 +222,28 @@ def build_route(
 
 def calculate_fit_score(
     route: Dict[str, Any],
-    candidates: List[Dict[str, Any]],
+    by_id: Mapping[int, Dict[str, Any]],
     vibe: str,
     intents: List[str],
 ) -> float:
     """Calculate fit score: 0.5*match + 0.25*geo + 0.15*rating + 0.1*diversity"""
-    if not route or not candidates:
+    if not route or not by_id:
         return 0.0
     
     # Get route places
-    route_places = [c for c in candidates if c['id'] in route['steps']]
+    route_places = [by_id[place_id] for place_id in route['steps']]
     
     # Match score (0.5 weight)
     match_score = 0.0
+    intents_lc = [intent.lower() for intent in intents]
     for place in route_places:
-        place_tags = place.get('tags_json', [])
         place_vibe = place.get('vibe_json', {})
+        tags_lc = place.get('tags_lc')
+        if tags_lc is None:
+            tags_lc = frozenset(tag.lower() for tag in place.get('tags_json', []))
         
         # Check intents match
-        intent_matches = sum(1 for intent in intents if intent.lower() in 
-                           [tag.lower() for tag in place_tags])
+        intent_matches = sum(1 for intent in intents_lc if intent in tags_lc)
         match_score += intent_matches / len(intents)
         
         # Check vibe match
@@ -213,28 +270,110 @@ def calculate_fit_score(
     
     return round(fit_score, 3)
 
-@app.get("/api/health")
-async def health_check() -> JSONResponse:
-    """Health check endpoint"""
-    start_time = time.time()
+def build_alternatives(
+    by_id: Mapping[int, Dict[str, Any]],
+    route: Dict[str, Any],
+    top_k: int = 5,
+    threshold: float = 0.3,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Find off-route places whose tags overlap the middle stop's"""
+    step2_tags = set(by_id[route['steps'][1]]['tags_json'])
+    route_set = set(route['steps'])
+    step2_alternatives: List[Dict[str, Any]] = []
+    append = step2_alternatives.append
+    
+    for place_id, candidate in by_id.items():
+        if place_id in route_set:
+            continue
+        candidate_tags = candidate['tags_json']
+        
+        # Share of the candidate's tags that step 2 also has
+        similarity = len(step2_tags.intersection(candidate_tags)) / max(len(candidate_tags), 1)
+        if similarity > threshold:
+            append({
+                'id': place_id,
+                'name': candidate['name'],
+                'similarity': round(similarity, 2)
+            })
+    
+    if not step2_alternatives:
+        return {}
+    step2_alternatives.sort(key=lambda x: x['similarity'], reverse=True)
+    return {'step2': step2_alternatives[:top_k]}
+
+def compute_recommendation(
+    conn: sqlite3.Connection,
+    search_provider: LocalSearchProvider,
+    vibe: str,
+    intent_list: List[str],
+    lat: float,
+    lng: float,
+    coords: Optional[PlaceCoords] = None,
+) -> Dict[str, Any]:
+    """Search, build a route and collect alternatives for one request"""
+    # Build search query
+    search_terms = [vibe] + intent_list
+    search_query = " OR ".join(search_terms).replace("-", " ")
     
-    # Check database connectivity
-    db_status = "up"
+    # Get candidates via FTS
+    fts_results = search_provider.fts(search_query, 20)
+    
+    # Get candidates via KNN
+    knn_results = search_provider.knn(search_query, 20)
+
+    # Merge both rankings and keep only the best candidates
+    all_candidates = reciprocal_rank_fusion(fts_results, knn_results, limit=MAX_CANDIDATES)
+
+    # Return early if no candidates were found
+    if not all_candidates:
+        raise HTTPException(status_code=404, detail="No candidates found")
+
+    # Fetch full place data
     try:
-        with sqlite3.connect(settings.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM places")
-    except Exception:
-        db_status = "down"
+        candidates = fetch_candidates(conn, all_candidates)
+    except Exception as e:
+        logger.error(f"Error fetching candidates: {e}")
+        raise HTTPException(status_code=500, detail="Database error")
+    
+    # Build route
+    route = build_route(candidates, lat, lng, coords=coords)
+    if not route:
+        raise HTTPException(status_code=404, detail="No suitable route found")
+    
+    # Calculate fit score
+    by_id = {c['id']: c for c in candidates}
+    route['fit_score'] = calculate_fit_score(route, by_id, vibe, intent_list)
+    
+    # Find alternatives for step 2 (middle place)
+    alternatives = build_alternatives(by_id, route) if len(candidates) > 3 else {}
+    
+    # Prepare result
+    result = {
+        "routes": [route],
+        "alternatives": alternatives
+    }
+    
+    return result
+
+_HEALTH_SQL = """
+    SELECT
+        EXISTS(SELECT 1 FROM sqlite_master WHERE name = 'places'),
+        EXISTS(SELECT 1 FROM sqlite_master WHERE name = 'fts_places')
+"""
 
-    # Check FTS status
-    fts_status = "up"
+@router.get("/api/health")
+def health_check(request: Request) -> JSONResponse:
+    """Health check endpoint"""
+    start_time = time.time()
+    conn = request.app.state.db.get()
+    
+    # Check database and FTS tables in one schema lookup
     try:
-        with sqlite3.connect(settings.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM fts_places")
+        has_places, has_fts = conn.execute(_HEALTH_SQL).fetchone()
     except Exception:
-        fts_status = "down"
+        has_places = has_fts = False
+    db_status = "up" if has_places else "down"
+    fts_status = "up" if has_fts else "down"
     
     response_time = round((time.time() - start_time) * 1000, 2)
     
@@ -246,146 +385,67 @@ async def health_check() -> JSONResponse:
         }
     )
 
-@app.get("/api/places/recommend")
-async def recommend_places(
+@router.get("/api/places/recommend")
+def recommend_places(
+    request: Request,
     vibe: str = Query(..., description="Vibe preference"),
     intents: str = Query(..., description="Comma-separated intents"),
     lat: float = Query(..., description="Starting latitude"),
     lng: float = Query(..., description="Starting longitude"),
-) -> JSONResponse:
+) -> Response:
     """Recommend places based on vibe, intents, and location"""
     start_time = time.time()
-    
+    state = request.app.state
+    cache_manager: CacheManager = state.cache_manager
+    search_provider: LocalSearchProvider = state.search_provider
+    conn: sqlite3.Connection = state.db.get()
+
     # Parse intents and build cache key
     intent_list = [intent.strip() for intent in intents.split(',')]
     city = "bangkok"  # Default city
-    day = datetime.now().strftime("%Y-%m-%d")  # Current day
+    day = today_str()  # Current day
     cache_key = cache_manager.build_cache_key(city, day, vibe, intent_list, lat, lng)
 
     # Try to get from cache
     cached_result, cache_status, cache_store = cache_manager.get(cache_key)
 
-    if cache_status == "HIT":
+    if cached_result is not None:
         response_time = round((time.time() - start_time) * 1000, 2)
+        etag = cached_result.etag
+        headers = {
+            "ETag": etag,
+            # Clients may reuse the response for as long as it stays cached here
+            "Cache-Control": f"max-age={cached_result.max_age()}",
+            "X-Search": "FTS+VEC",
+            "X-Cache-Status": cache_status,
+            "X-Cache-Store": cache_store,
+            "X-Debug": f"time_ms={response_time};db=up;rank=recommend;cache={cache_status};store={cache_store}"
+        }
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
 
-        return JSONResponse(
-            content=cached_result,
-            headers={
-                "X-Search": "FTS+VEC",
-                "X-Cache-Status": cache_status,
-                "X-Cache-Store": cache_store,
-                "X-Debug": f"time_ms={response_time};db=up;rank=recommend;cache={cache_status};store={cache_store}"
-            }
+        return Response(
+            content=cached_result.body,
+            media_type="application/json",
+            headers=headers,
         )
 
     # Cache miss, compute recommendation
-
-    # Build search query
-    search_terms = [vibe] + intent_list
-    search_query = " OR ".join(search_terms).replace("-", " ")
-    
-    # Get candidates via FTS
-    fts_results = search_provider.fts(search_query, 20)
-    fts_candidates = [doc_id for doc_id, score in fts_results]
-    
-    # Get candidates via KNN
-    knn_results = search_provider.knn(search_query, 20)
-    knn_candidates = [doc_id for doc_id, score in knn_results]
-
-    # Combine and deduplicate candidates
-    all_candidates = list(set(fts_candidates + knn_candidates))
-
-    # Return early if no candidates were found to avoid invalid SQL
-    if not all_candidates:
-        raise HTTPException(status_code=404, detail="No candidates found")
-
-    # Fetch full place data
-    candidates = []
-    try:
-        with sqlite3.connect(settings.db_path) as conn:
-            cursor = conn.cursor()
-
-            if len(all_candidates) < 3:
-                cursor.execute("SELECT id FROM places LIMIT 3")
-                extra_ids = [row[0] for row in cursor.fetchall()]
-                # Ensure we keep original candidates while topping up
-                all_candidates = list(set(all_candidates + extra_ids))
-
-            placeholders = ','.join(['?' for _ in all_candidates])
-            cursor.execute(f'''
-                SELECT id, name, summary_160, lat, lng, district, rating,
-                       tags_json, vibe_json, quality_score
-                FROM places WHERE id IN ({placeholders})
-            ''', all_candidates)
-
-            for row in cursor.fetchall():
-                candidates.append({
-                    'id': row[0],
-                    'name': row[1],
-                    'summary_160': row[2],
-                    'lat': row[3],
-                    'lng': row[4],
-                    'district': row[5],
-                    'rating': row[6],
-                    'tags_json': json.loads(row[7]) if row[7] else [],
-                    'vibe_json': json.loads(row[8]) if row[8] else {},
-                    'quality_score': row[9]
-                    })
-
-    except Exception as e:
-        logger.error(f"Error fetching candidates: {e}")
-        raise HTTPException(status_code=500, detail="Database error")
-    
-    # Build route
-    route = build_route(candidates, lat, lng)
-    if not route:
-        raise HTTPException(status_code=404, detail="No suitable route found")
-    
-    # Calculate fit score
-    route['fit_score'] = calculate_fit_score(route, candidates, vibe, intent_list)
-    
-    # Find alternatives for step 2 (middle place)
-    alternatives = {}
-    if len(candidates) > 3:
-        step2_alternatives = []
-        current_step2 = route['steps'][1]
-        
-        for candidate in candidates:
-            if (candidate['id'] != current_step2 and 
-                candidate['id'] not in route['steps']):
-                # Check if it's a good alternative (similar tags, different from step 1 and 3)
-                candidate_tags = candidate['tags_json']
-                
-                # Calculate similarity to step 2
-                similarity = len(set(candidate_tags) & set(
-                    next(c['tags_json'] for c in candidates if c['id'] == current_step2)
-                )) / max(len(candidate_tags), 1)
-                
-                if similarity > 0.3:  # At least 30% tag overlap
-                    step2_alternatives.append({
-                        'id': candidate['id'],
-                        'name': candidate['name'],
-                        'similarity': round(similarity, 2)
-                    })
-        
-        if step2_alternatives:
-            step2_alternatives.sort(key=lambda x: x['similarity'], reverse=True)
-            alternatives['step2'] = step2_alternatives[:5]
-    
-    # Prepare result
-    result = {
-        "routes": [route],
-        "alternatives": alternatives
-    }
+    result = compute_recommendation(
+        conn, search_provider, vibe, intent_list, lat, lng, coords=state.place_coords
+    )
     
-    # Cache the result
-    cache_manager.set(cache_key, result)
+    # Serialize once; the same bytes are cached and sent to the client
+    entry = cache_manager.set_payload(cache_key, orjson.dumps(result))
     
     response_time = round((time.time() - start_time) * 1000, 2)
     
-    return JSONResponse(
-        content=result,
+    return Response(
+        content=entry.body,
+        media_type="application/json",
         headers={
+            "ETag": entry.etag,
+            "Cache-Control": f"max-age={entry.max_age()}",
             "X-Search": "FTS+VEC",
             "X-Cache-Status": "MISS",
             "X-Cache-Store": "compute",
@@ -393,27 +453,69 @@ async def recommend_places(
         }
     )
 
-@app.get("/api/places/{place_id}")
-async def get_place(place_id: int) -> JSONResponse:
+@router.get("/api/places/{place_id}")
+def get_place(request: Request, place_id: int) -> Response:
     """Get place by ID"""
     start_time = time.time()
     
-    place = get_place_by_id(place_id)
+    place = get_place_by_id(place_id, request.app.state.db.get())
     if not place:
         raise HTTPException(status_code=404, detail="Place not found")
     
     response_time = round((time.time() - start_time) * 1000, 2)
     
-    return JSONResponse(
-        content=place,
+    return Response(
+        content=orjson.dumps(place),
+        media_type="application/json",
         headers={
             "X-Search": "FTS+VEC",
             "X-Debug": f"time_ms={response_time};db=up;rank=id_lookup"
         }
     )
 
-@app.get("/api/cache/warm")
+def warm_combo(
+    state: Any,
+    city: str,
+    day: str,
+    combo: str,
+    lat: float,
+    lng: float,
+) -> Optional[str]:
+    """Precompute and cache one ``vibe:intents`` combo; return its key if warmed"""
+    if ':' not in combo:
+        return None
+    cache_manager: CacheManager = state.cache_manager
+    
+    vibe_part, intents_part = combo.split(':', 1)
+    vibe = vibe_part.strip()
+    intent_list = [intent.strip() for intent in intents_part.strip().split(',')]
+    
+    # Build cache key and skip combos that are already cached
+    cache_key = cache_manager.build_cache_key(city, day, vibe, intent_list, lat, lng)
+    cached_value, cache_status, cache_store = cache_manager.get(cache_key)
+    if cache_status != "MISS":
+        return None
+    
+    # Precompute recommendation
+    try:
+        result = compute_recommendation(
+            state.db.get(), state.search_provider, vibe, intent_list, lat, lng, coords=state.place_coords
+        )
+    except HTTPException as e:
+        # A 404 just means there is nothing to recommend for this combo
+        if e.status_code != 404:
+            logger.error(f"Error warming cache for combo {combo}: {e.detail}")
+        return None
+    except Exception as e:
+        logger.error(f"Error warming cache for combo {combo}: {e}")
+        return None
+    
+    cache_manager.set(cache_key, result)
+    return cache_key
+
+@router.get("/api/cache/warm")
 async def warm_cache(
+    request: Request,
     city: str = Query(..., description="City for warming cache"),
     day: str = Query(..., description="Date for warming cache (YYYY-MM-DD)"),
     combos: str = Query(..., description="Vibe:intent1,intent2,intent3|vibe2:intent4,intent5,intent6"),
@@ -429,6 +531,7 @@ async def warm_cache(
     Uses default Bangkok coordinates if lat/lng not provided
     """
     start_time = time.time()
+    state = request.app.state
 
     if lat is None or lng is None:
         raise HTTPException(status_code=400, detail="lat/lng required for this operation")
@@ -436,119 +539,16 @@ async def warm_cache(
     lng = float(lng)
 
     try:
-        warmed_count = 0
-        warmed_keys = []
-        
         # Parse combos
         combo_list = combos.split('|')
         
-        for combo in combo_list:
-            if ':' not in combo:
-                continue
-                
-            vibe_part, intents_part = combo.split(':', 1)
-            vibe = vibe_part.strip()
-            intents = intents_part.strip()
-            intent_list = [intent.strip() for intent in intents.split(',')]
-
-            # Build cache key
-            cache_key = cache_manager.build_cache_key(city, day, vibe, intent_list, lat, lng)
-
-            # Check if already cached
-            cached_value, cache_status, cache_store = cache_manager.get(cache_key)
-
-            if cache_status == "MISS":
-                # Precompute recommendation
-                try:
-                    
-                    # Build search query
-                    search_terms = [vibe] + intent_list
-                    search_query = " OR ".join(search_terms).replace("-", " ")
-
-                    # Get candidates via FTS and KNN (same logic as recommend endpoint)
-                    fts_results = search_provider.fts(search_query, 20)
-                    fts_candidates = [doc_id for doc_id, score in fts_results]
-
-                    knn_results = search_provider.knn(search_query, 20)
-                    knn_candidates = [doc_id for doc_id, score in knn_results]
-
-                    all_candidates = list(set(fts_candidates + knn_candidates))
-
-                    # Fetch full place data
-                    candidates = []
-                    with sqlite3.connect(settings.db_path) as conn:
-                        cursor = conn.cursor()
-
-                        if len(all_candidates) < 3:
-                            cursor.execute("SELECT id FROM places LIMIT 3")
-                            all_candidates = [row[0] for row in cursor.fetchall()]
-
-                        if all_candidates:
-                            placeholders = ','.join(['?' for _ in all_candidates])
-                            cursor.execute(f'''
-                                SELECT id, name, summary_160, lat, lng, district, rating,
-                                       tags_json, vibe_json, quality_score
-                                FROM places WHERE id IN ({placeholders})
-                            ''', all_candidates)
-
-                            for row in cursor.fetchall():
-                                candidates.append({
-                                    'id': row[0],
-                                    'name': row[1],
-                                    'summary_160': row[2],
-                                    'lat': row[3],
-                                    'lng': row[4],
-                                    'district': row[5],
-                                    'rating': row[6],
-                                    'tags_json': json.loads(row[7]) if row[7] else [],
-                                    'vibe_json': json.loads(row[8]) if row[8] else {},
-                                    'quality_score': row[9]
-                                })
-                    
-                    # Build route and calculate score
-                    if len(candidates) >= 3:
-                        route = build_route(candidates, lat, lng)
-                        if route:
-                            route['fit_score'] = calculate_fit_score(route, candidates, vibe, intent_list)
-                            
-                            # Find alternatives
-                            alternatives = {}
-                            if len(candidates) > 3:
-                                step2_alternatives = []
-                                current_step2 = route['steps'][1]
-                                
-                                for candidate in candidates:
-                                    if (candidate['id'] != current_step2 and 
-                                        candidate['id'] not in route['steps']):
-                                        candidate_tags = candidate['tags_json']
-                                        similarity = len(set(candidate_tags) & set(
-                                            next(c['tags_json'] for c in candidates if c['id'] == current_step2)
-                                        )) / max(len(candidate_tags), 1)
-                                        
-                                        if similarity > 0.3:
-                                            step2_alternatives.append({
-                                                'id': candidate['id'],
-                                                'name': candidate['name'],
-                                                'similarity': round(similarity, 2)
-                                            })
-                                
-                                if step2_alternatives:
-                                    step2_alternatives.sort(key=lambda x: x['similarity'], reverse=True)
-                                    alternatives['step2'] = step2_alternatives[:5]
-                            
-                            # Cache the result
-                            result = {
-                                "routes": [route],
-                                "alternatives": alternatives
-                            }
-                            
-                            cache_manager.set(cache_key, result)
-                            warmed_count += 1
-                            warmed_keys.append(cache_key)
-                            
-                except Exception as e:
-                    logger.error(f"Error warming cache for combo {combo}: {e}")
-                    continue
+        # Each combo runs on a worker thread with its own pooled connection
+        results = await asyncio.gather(*(
+            asyncio.to_thread(warm_combo, state, city, day, combo, lat, lng)
+            for combo in combo_list
+        ))
+        warmed_keys = [key for key in results if key is not None]
+        warmed_count = len(warmed_keys)
         
         response_time = round((time.time() - start_time) * 1000, 2)
         
@@ -569,41 +569,37 @@ async def warm_cache(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Cache warming failed: {str(e)}")
 
-@app.post("/api/feedback")
-async def submit_feedback(feedback: FeedbackRequest) -> JSONResponse:
+@router.post("/api/cache/invalidate")
+def invalidate_cache(request: Request) -> JSONResponse:
+    """Drop memoized search results, e.g. after the search index was rebuilt"""
+    start_time = time.time()
+    request.app.state.search_provider.clear_search_cache()
+    response_time = round((time.time() - start_time) * 1000, 2)
+    
+    return JSONResponse(
+        content={"cleared": ["search"]},
+        headers={
+            "X-Search": "FTS+VEC",
+            "X-Debug": f"time_ms={response_time};db=up;rank=invalidate"
+        }
+    )
+
+@router.post("/api/feedback")
+async def submit_feedback(request: Request, feedback: FeedbackRequest) -> JSONResponse:
     """Submit feedback about a route"""
     start_time = time.time()
+    feedback_writer: FeedbackWriter = request.app.state.feedback_writer
     
     try:
         # Log the feedback operation
         log_operation("feedback_submit", route_ids=feedback.route, useful=feedback.useful, has_note=bool(feedback.note))
         
-        # Store feedback in database
-        with sqlite3.connect(settings.db_path) as conn:
-            cursor = conn.cursor()
-
-            # Create feedback table if it doesn't exist
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS feedback (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    created_at TEXT NOT NULL,
-                    route_json TEXT NOT NULL,
-                    useful BOOLEAN NOT NULL,
-                    note TEXT
-                )
-            ''')
-
-            # Insert feedback
-            route_json = json.dumps(feedback.route)
-            created_at = datetime.now().isoformat()
-
-            cursor.execute('''
-                INSERT INTO feedback (created_at, route_json, useful, note)
-                VALUES (?, ?, ?, ?)
-            ''', (created_at, route_json, feedback.useful, feedback.note))
-
-            feedback_id = cursor.lastrowid
-            conn.commit()
+        # Store feedback in database; concurrent submissions share a commit
+        route_json = orjson.dumps(feedback.route).decode()
+        created_at = datetime.now().isoformat()
+        feedback_id = await asyncio.to_thread(
+            feedback_writer.submit, (created_at, route_json, feedback.useful, feedback.note)
+        )
         
         response_time = round((time.time() - start_time) * 1000, 2)
         
@@ -625,6 +621,106 @@ async def submit_feedback(feedback: FeedbackRequest) -> JSONResponse:
         log_operation("feedback_error", error=str(e), route_ids=feedback.route)
         raise HTTPException(status_code=500, detail=f"Failed to submit feedback: {str(e)}")
 
+async def prefill_cache(state: Any, manifest_path: str) -> int:
+    """Warm the combos listed in a JSON manifest; return how many were cached
+
+    The manifest is a list of ``{"city", "combos", "lat", "lng", "day"}``
+    objects where ``combos`` uses the ``/api/cache/warm`` format and ``day``
+    defaults to today. Combos run one at a time with a short pause so the
+    prefill does not compete with live requests for CPU.
+    """
+    try:
+        entries = orjson.loads(Path(manifest_path).read_bytes())
+    except (OSError, orjson.JSONDecodeError) as e:
+        logger.error(f"Cannot read warm manifest {manifest_path}: {e}")
+        return 0
+    if not isinstance(entries, list):
+        logger.error(f"Warm manifest {manifest_path} is not a list; skipping prefill")
+        return 0
+
+    warmed = 0
+    for entry in entries:
+        try:
+            city, combos = entry['city'], entry['combos']
+            if not isinstance(city, str) or not isinstance(combos, str):
+                raise TypeError("city and combos must be strings")
+            day = entry.get('day') or today_str()
+            lat = float(entry.get('lat', 13.7563))
+            lng = float(entry.get('lng', 100.5018))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            logger.error(f"Skipping invalid warm manifest entry {entry!r}: {e!r}")
+            continue
+        for combo in combos.split('|'):
+            if await asyncio.to_thread(warm_combo, state, city, day, combo, lat, lng):
+                warmed += 1
+            await asyncio.sleep(0.01)
+    log_operation("cache_prefill", manifest=manifest_path, warmed=warmed)
+    return warmed
+
+@asynccontextmanager
+async def _lifespan(application: FastAPI) -> AsyncIterator[None]:
+    state = application.state
+    prefill = None
+    if state.settings.warm_manifest_path:
+        prefill = asyncio.create_task(prefill_cache(state, state.settings.warm_manifest_path))
+    state.prefill_task = prefill
+    try:
+        yield
+    finally:
+        try:
+            if prefill is not None:
+                prefill.cancel()
+                # A failed prefill was already logged; it must not block shutdown
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await prefill
+        finally:
+            state.cache_manager.close()
+            state.feedback_writer.close()
+            state.search_provider.close()
+            state.db.close()
+
+
+def create_app(config: Optional[Settings] = None) -> FastAPI:
+    """Build an API instance bound to the databases named in ``config``.
+
+    Nothing is opened at import time; serve with
+    ``uvicorn --factory apps.api.main:create_app`` to use the environment
+    settings.
+    """
+    if config is None:
+        config = settings
+    application = FastAPI(title="Entertainment Planner API", lifespan=_lifespan)
+
+    # Add timing middleware
+    application.add_middleware(TimingMiddleware)
+
+    # Ensure database exists with seed data
+    db_file = Path(config.db_path)
+    if not db_file.exists():
+        db_file.parent.mkdir(parents=True, exist_ok=True)
+        init_clean_db(db_file)
+        seed_mock_data(db_file)
+
+    # Initialize search provider and cache manager
+    application.state.settings = config
+    application.state.db = ConnectionPool(config.db_path)
+    # Databases created before feedback existed get the table here
+    conn = application.state.db.get()
+    conn.execute(FEEDBACK_TABLE_DDL)
+    application.state.feedback_writer = FeedbackWriter(config.db_path)
+    application.state.place_coords = PlaceCoords(conn.execute(
+        "SELECT id, lat, lng FROM places WHERE lat IS NOT NULL AND lng IS NOT NULL"
+    ))
+    application.state.search_provider = LocalSearchProvider(config.db_path)
+    application.state.cache_manager = CacheManager(
+        sqlite_db_path=config.db_path,
+        snapshot_path=config.cache_snapshot_path or None,
+    )
+
+    application.include_router(router)
+    return application
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(create_app, factory=True, host="0.0.0.0", port=8000)
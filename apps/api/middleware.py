@@ -1,78 +1,87 @@
 from __future__ import annotations
 
-import json
 import logging
 import time
 from typing import Any, Callable, Dict, List, Optional, Tuple, cast  # noqa: F401
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+import orjson
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-# Configure structured logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+from logger import logger
 
-class TimingMiddleware(BaseHTTPMiddleware):
-    """Middleware for timing requests and logging structured data"""
+
+class TimingMiddleware:
+    """ASGI middleware for timing requests and logging structured data
+
+    Written against the raw ASGI interface rather than ``BaseHTTPMiddleware``
+    so requests are not routed through an extra task group and stream.
+    """
     
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.perf_counter()
         
         # Extract operation name from path
-        op = request.url.path
+        path = scope['path']
+        op = path
         if op.startswith('/api/'):
             op = op[5:]  # Remove /api/ prefix
         
-        # Process request
-        response = await call_next(request)
-        
-        # Calculate timing
-        end_time = time.time()
-        duration_ms = round((end_time - start_time) * 1000, 2)
-        
-        # Extract additional data from response headers if available
-        db_status = response.headers.get('X-Debug', '').split('db=')[1].split(';')[0] if 'db=' in response.headers.get('X-Debug', '') else 'unknown'
-        cache_status = response.headers.get('X-Cache-Status', 'unknown')
-        cache_store = response.headers.get('X-Cache-Store', 'unknown')
-        
-        # Build timing log
-        timing_log = {
-            'op': op,
-            'ms': duration_ms,
-            'status': response.status_code,
-            'db': db_status,
-            'cache': f"{cache_status}:{cache_store}",
-            'method': request.method,
-            'path': str(request.url.path),
-            'query': str(request.query_params) if request.query_params else None
-        }
-        
-        # Log as JSON for structured logging
-        logger.info(json.dumps(timing_log))
-        
-        # Update response headers with timing info
-        existing_debug = response.headers.get('X-Debug', '')
-        if existing_debug:
-            new_debug = f"{existing_debug};time_ms={duration_ms}"
-        else:
-            new_debug = f"time_ms={duration_ms};db={db_status};cache={cache_status}:{cache_store}"
-        
-        response.headers['X-Debug'] = new_debug
+        async def send_with_timing(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                # Calculate timing
+                duration_ms = round((time.perf_counter() - start_time) * 1000, 2)
+                headers = MutableHeaders(scope=message)
+                
+                # Extract additional data from response headers if available
+                existing_debug = headers.get('X-Debug', '')
+                db_status = 'unknown'
+                if 'db=' in existing_debug:
+                    db_status = existing_debug.partition('db=')[2].partition(';')[0]
+                cache_status = headers.get('X-Cache-Status', 'unknown')
+                cache_store = headers.get('X-Cache-Store', 'unknown')
+                
+                # Log as JSON for structured logging, unless INFO is filtered out
+                if logger.isEnabledFor(logging.INFO):
+                    query = scope['query_string'].decode('latin-1')
+                    timing_log = {
+                        'op': op,
+                        'ms': duration_ms,
+                        'status': message['status'],
+                        'db': db_status,
+                        'cache': f"{cache_status}:{cache_store}",
+                        'method': scope['method'],
+                        'path': path,
+                        'query': query or None
+                    }
+                    logger.info(orjson.dumps(timing_log).decode())
+                
+                # Update response headers with timing info
+                if existing_debug:
+                    new_debug = f"{existing_debug};time_ms={duration_ms}"
+                else:
+                    new_debug = f"time_ms={duration_ms};db={db_status};cache={cache_status}:{cache_store}"
+                
+                headers['X-Debug'] = new_debug
+            
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_timing)
 
 def log_operation(operation: str, **kwargs: Any) -> None:
     """Helper function to log operations with structured data"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
     log_data = {
         'op': operation,
         'timestamp': time.time(),
         **kwargs,
     }
-    logger.info(json.dumps(log_data))
+    logger.info(orjson.dumps(log_data).decode())
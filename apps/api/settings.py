@@ -8,6 +8,8 @@ class Settings(BaseSettings):
     db_path: str = "./data/clean.db"
     raw_db_path: str = "./data/raw.db"
     cache_db_path: str = "./data/cache.db"
+    cache_snapshot_path: str = ""
+    warm_manifest_path: str = ""
     http_timeout: int = 30
     log_level: str = "INFO"
 
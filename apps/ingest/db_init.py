@@ -1,5 +1,6 @@
 import json
 import sqlite3
+from operator import itemgetter
 from pathlib import Path
 from typing import Union
 
@@ -13,6 +14,7 @@ def init_raw_db(db_path: Union[str, Path] = "raw.db"):
         Location of the raw database. Can be a string path or ``Path`` object.
     """
     conn = sqlite3.connect(str(db_path))
+    conn.execute('PRAGMA journal_mode=WAL')
     cursor = conn.cursor()
     
     # Create raw_places table
@@ -41,8 +43,72 @@ def init_raw_db(db_path: Union[str, Path] = "raw.db"):
     print(f"✅ {db_path} initialized with raw_places table")
 
 
+# The table keeps its own copy of the indexed text, so re-indexing a rowid
+# with INSERT OR REPLACE drops the document's old terms. Contentless tables
+# (content='') cannot do that on SQLite < 3.43, and external content does
+# not fit because the indexed text is built from several places columns.
+FTS_PLACES_DDL = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS fts_places USING FTS5(
+        name,
+        summary_160,
+        tags
+    )
+'''
+
+
+def migrate_fts_places(conn: sqlite3.Connection) -> None:
+    """Create fts_places, replacing a legacy contentless table
+
+    The replacement is filled from places; ``build_index`` rebuilds it with
+    the full search text.
+    """
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'fts_places'").fetchone()
+    if row is not None and "content=''" not in row[0].replace(" ", ""):
+        return
+    conn.execute('DROP TABLE IF EXISTS fts_places')
+    conn.execute(FTS_PLACES_DDL)
+    conn.execute('''
+        INSERT INTO fts_places (rowid, name, summary_160, tags)
+        SELECT id, name, summary_160, tags_json FROM places
+    ''')
+
+
+# Enrichment upserts places by name
+PLACES_NAME_INDEX_DDL = 'CREATE UNIQUE INDEX IF NOT EXISTS idx_places_name ON places(name)'
+
+
+def ensure_places_name_index(conn: sqlite3.Connection) -> None:
+    """Create the unique index on places.name, merging duplicate names first
+
+    Databases enriched before the index existed can hold several rows per
+    name. The most recently inserted one is kept, and embeddings and FTS
+    rows left without a place are removed.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_places_name'").fetchone():
+        return
+    removed = conn.execute(
+        'DELETE FROM places WHERE id NOT IN (SELECT MAX(id) FROM places GROUP BY name)'
+    ).rowcount
+    if removed:
+        conn.execute('DELETE FROM embeddings WHERE doc_id NOT IN (SELECT id FROM places)')
+        migrate_fts_places(conn)
+        conn.execute('DELETE FROM fts_places WHERE rowid NOT IN (SELECT id FROM places)')
+    conn.execute(PLACES_NAME_INDEX_DDL)
+
+
+# Route feedback submitted through the API
+FEEDBACK_TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        route_json TEXT NOT NULL,
+        useful BOOLEAN NOT NULL,
+        note TEXT
+    )
+'''
+
 def init_clean_db(db_path: Union[str, Path] = "clean.db"):
-    """Initialize clean.db with places, embeddings, and FTS5 tables
+    """Initialize clean.db with places, embeddings, FTS5 and feedback tables
 
     Parameters
     ----------
@@ -50,6 +116,7 @@ def init_clean_db(db_path: Union[str, Path] = "clean.db"):
         Location of the clean database. Can be a string path or ``Path`` object.
     """
     conn = sqlite3.connect(str(db_path))
+    conn.execute('PRAGMA journal_mode=WAL')
     cursor = conn.cursor()
     
     # Create places table
@@ -88,20 +155,28 @@ def init_clean_db(db_path: Union[str, Path] = "clean.db"):
     ''')
     
     # Create FTS5 table
-    cursor.execute('''
-        CREATE VIRTUAL TABLE IF NOT EXISTS fts_places USING FTS5(
-            name,
-            summary_160,
-            tags,
-            content=''
-        )
-    ''')
+    migrate_fts_places(conn)
+    
+    # Names are unique so enrichment can upsert by name
+    ensure_places_name_index(conn)
+    
+    # Create feedback table
+    cursor.execute(FEEDBACK_TABLE_DDL)
     
     conn.commit()
     conn.close()
     print(f"✅ {db_path} initialized with places, embeddings, and FTS5 tables")
 
 
+# Columns filled by seed_mock_data, in insert order
+PLACE_SEED_COLUMNS = (
+    'name', 'summary_160', 'full_description', 'lat', 'lng', 'district', 'city',
+    'price_level', 'rating', 'ratings_count', 'hours_json', 'phone', 'site',
+    'gmap_url', 'photos_json', 'tags_json', 'vibe_json', 'quality_score',
+)
+_SEED_ROW = itemgetter(*PLACE_SEED_COLUMNS)
+
+
 def seed_mock_data(db_path: Union[str, Path] = "clean.db"):
     """Seed clean.db with 3 mock Bangkok places
 
@@ -176,31 +251,20 @@ def seed_mock_data(db_path: Union[str, Path] = "clean.db"):
         }
     ]
     
-    for place in mock_places:
-        cursor.execute(
-            '''
-            INSERT INTO places (
-                name, summary_160, full_description, lat, lng, district, city,
-                price_level, rating, ratings_count, hours_json, phone, site,
-                gmap_url, photos_json, tags_json, vibe_json, quality_score
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''',
-            (
-                place['name'], place['summary_160'], place['full_description'],
-                place['lat'], place['lng'], place['district'], place['city'],
-                place['price_level'], place['rating'], place['ratings_count'],
-                place['hours_json'], place['phone'], place['site'],
-                place['gmap_url'], place['photos_json'], place['tags_json'],
-                place['vibe_json'], place['quality_score']
-            ),
-        )
+    cursor.executemany(
+        f'''
+        INSERT OR IGNORE INTO places ({", ".join(PLACE_SEED_COLUMNS)})
+        VALUES ({", ".join("?" * len(PLACE_SEED_COLUMNS))})
+        ''',
+        map(_SEED_ROW, mock_places),
+    )
 
-    # Update FTS5 table with all rows
-    cursor.execute('DELETE FROM fts_places')
+    # Rebuild the FTS5 table with rowids matching places.id
+    cursor.execute("DELETE FROM fts_places")
     cursor.execute(
         '''
-        INSERT INTO fts_places (name, summary_160, tags)
-        SELECT name, summary_160, tags_json FROM places
+        INSERT INTO fts_places (rowid, name, summary_160, tags)
+        SELECT id, name, summary_160, tags_json FROM places
         '''
     )
     
@@ -7,7 +7,7 @@ from dataclasses import dataclass
 from typing import Optional
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class EnrichmentResult:
     """Result of place enrichment"""
     rating: Optional[float] = None
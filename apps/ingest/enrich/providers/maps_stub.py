@@ -4,26 +4,71 @@ Deterministic fake enrichment data + real Google Maps web scraping with correct
 """
 import json
 import re
+import sqlite3
+import threading
 import time
-from typing import Dict, Optional
+from dataclasses import asdict
+from typing import Dict, Optional, Tuple
 
 import requests
-from bs4 import BeautifulSoup
-from enricher import EnrichmentProvider, EnrichmentResult
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from apps.ingest.enrich.enricher import EnrichmentProvider, EnrichmentResult
 from logger import logger
 
+# Body of each inline <script> element
+_RE_SCRIPT = re.compile(r'<script\b[^>]*>(.*?)</script>', re.IGNORECASE | re.DOTALL)
+_RE_SCRIPT_LAT = re.compile(r'"lat":\s*([-\d.]+)')
+_RE_SCRIPT_LNG = re.compile(r'"lng":\s*([-\d.]+)')
+
+# Place IDs (ChIJ strings, bare or as "place_id":"..."/place_id:...), numeric
+# CIDs (cid=..., "cid":"...", cid:...) and @lat,lng pairs in result pages
+_RE_LINK_PARTS = re.compile(
+    r'(?P<place_id>ChIJ[-\w]{20,})'
+    r'|cid(?:=|:|":\s*")(?P<cid>\d{10,})'
+    r'|@(?P<lat>[-\d.]+),(?P<lng>[-\d.]+)'
+)
+
+# Default hours (most places in Bangkok are open daily)
+DAILY_HOURS_JSON = json.dumps({
+    "monday": "09:00-22:00",
+    "tuesday": "09:00-22:00",
+    "wednesday": "09:00-22:00",
+    "thursday": "09:00-22:00",
+    "friday": "09:00-22:00",
+    "saturday": "09:00-22:00",
+    "sunday": "09:00-22:00"
+})
+
 
 class GoogleMapsProvider(EnrichmentProvider):
     """Real Google Maps provider using web scraping with correct URL formats"""
     
-    def __init__(self):
+    # Cached lookups are reused across runs for this long
+    CACHE_TTL_SECONDS = 30 * 24 * 3600
+    # Minimum spacing between Google requests, shared by all worker threads
+    REQUEST_INTERVAL_S = 2.0
+
+    def __init__(self, cache_path: str = ":memory:"):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
-        # Cache for already enriched places
-        self.cache = {}
+        # Keep connections to google.com alive across places and retry
+        # transient failures and rate limiting with backoff
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 502, 503, 504))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=8, max_retries=retry))
+        self._throttle_lock = threading.Lock()
+        self._next_request_at = 0.0
+        # Already enriched places, persisted when cache_path is a file so
+        # re-runs do not refetch them
+        self._cache_lock = threading.Lock()
+        self._cache_conn = sqlite3.connect(cache_path, check_same_thread=False, isolation_level=None)
+        self._cache_conn.execute(
+            "CREATE TABLE IF NOT EXISTS gmaps_cache "
+            "(key TEXT PRIMARY KEY, result_json TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
     
     def enrich(self, name_raw: str, address_raw: str, city: str) -> EnrichmentResult:
         """Enrich place data from Google Maps"""
@@ -32,9 +77,10 @@ class GoogleMapsProvider(EnrichmentProvider):
         cache_key = f"{name_raw}_{city}"
         
         # Check cache first
-        if cache_key in self.cache:
+        cached = self._cache_get(cache_key)
+        if cached is not None:
             logger.info(f"📋 Using cached data for: {name_raw}")
-            return self.cache[cache_key]
+            return cached
         
         try:
             logger.info(f"🔍 Enriching from Google Maps: {name_raw}")
@@ -48,17 +94,19 @@ class GoogleMapsProvider(EnrichmentProvider):
             search_url = f"https://www.google.com/maps/search/{search_query.replace(' ', '+')}"
             
             # Get search results page
+            self._wait_for_request_slot()
             response = self.session.get(search_url, timeout=30)
             response.raise_for_status()
             
-            # Parse the page to find place details
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Only a few known patterns are needed, so search the raw HTML
+            # instead of building a parse tree
+            html_content = response.text
             
             # Extract place information
-            place_data = self._extract_place_data(soup, name_raw)
+            place_data = self._extract_place_data(html_content, name_raw)
             
             # Try to extract the first place link from search results using correct methods
-            place_link = self._extract_first_place_link(soup, name_raw)
+            place_link = self._extract_first_place_link(html_content, name_raw)
             
             # Use the generated link
             gmap_url = place_link if place_link else f"https://maps.google.com/maps?q={name_raw.replace(' ', '+')}+{city}"
@@ -77,10 +125,7 @@ class GoogleMapsProvider(EnrichmentProvider):
             )
             
             # Cache the result
-            self.cache[cache_key] = result
-            
-            # Be respectful with requests
-            time.sleep(2)
+            self._cache_put(cache_key, result)
             
             return result
             
@@ -89,109 +134,82 @@ class GoogleMapsProvider(EnrichmentProvider):
             # Return fallback data
             return self._get_fallback_data(name_raw, city)
     
-    def _extract_place_data(self, soup: BeautifulSoup, name_raw: str) -> Dict:
-        """Extract place data from Google Maps page"""
+    def _wait_for_request_slot(self) -> None:
+        """Be respectful with requests: space them REQUEST_INTERVAL_S apart across threads"""
+        with self._throttle_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_request_at)
+            self._next_request_at = slot + self.REQUEST_INTERVAL_S
+        time.sleep(slot - now)
+
+    def _cache_get(self, key: str) -> Optional[EnrichmentResult]:
+        with self._cache_lock:
+            row = self._cache_conn.execute(
+                "SELECT result_json FROM gmaps_cache WHERE key = ? AND fetched_at > ?",
+                (key, time.time() - self.CACHE_TTL_SECONDS),
+            ).fetchone()
+        return EnrichmentResult(**json.loads(row[0])) if row else None
+
+    def _cache_put(self, key: str, result: EnrichmentResult) -> None:
+        with self._cache_lock:
+            self._cache_conn.execute(
+                "INSERT OR REPLACE INTO gmaps_cache (key, result_json, fetched_at) VALUES (?, ?, ?)",
+                (key, json.dumps(asdict(result)), time.time()),
+            )
+
+    def _extract_place_data(self, html_content: str, name_raw: str) -> Dict:
+        """Extract place data from Google Maps page HTML"""
         place_data = {}
         
         try:
-            # Look for coordinates in the page
-            script_tags = soup.find_all('script')
-            for script in script_tags:
-                if script.string and 'lat' in script.string and 'lng' in script.string:
-                    lat_match = re.search(r'"lat":\s*([-\d.]+)', script.string)
-                    lng_match = re.search(r'"lng":\s*([-\d.]+)', script.string)
+            # Look for coordinates in the page's inline scripts
+            for script_match in _RE_SCRIPT.finditer(html_content):
+                script = script_match.group(1)
+                if 'lat' in script and 'lng' in script:
+                    lat_match = _RE_SCRIPT_LAT.search(script)
+                    lng_match = _RE_SCRIPT_LNG.search(script)
                     if lat_match and lng_match:
                         place_data['lat'] = float(lat_match.group(1))
                         place_data['lng'] = float(lng_match.group(1))
                         break
             
-            # Default hours (most places in Bangkok are open daily)
-            place_data['hours_json'] = json.dumps({
-                "monday": "09:00-22:00",
-                "tuesday": "09:00-22:00",
-                "wednesday": "09:00-22:00",
-                "thursday": "09:00-22:00",
-                "friday": "09:00-22:00",
-                "saturday": "09:00-22:00",
-                "sunday": "09:00-22:00"
-            })
+            place_data['hours_json'] = DAILY_HOURS_JSON
             
         except Exception as e:
             logger.warning(f"⚠️ Error extracting place data: {e}")
         
         return place_data
     
-    def _extract_first_place_link(self, soup: BeautifulSoup, name_raw: str) -> Optional[str]:
+    def _extract_first_place_link(self, html_content: str, name_raw: str) -> Optional[str]:
         """Extract place link using correct Google Maps URL formats based on ID type"""
         try:
             logger.info(f"🔍 Attempting to extract place link for: {name_raw}")
             
-            # Extract data from HTML
-            html_content = str(soup)
             place_data = {}
             
-            # Look for Place ID (ChIJ strings) - these are NOT numeric CIDs
-            # Try multiple patterns for finding Place IDs
-            place_id_matches = []
-            
-            # Pattern 1: ChIJiW5PNgCf4jARFz9UHGvCjT8 (direct match)
-            direct_place_id_matches = re.findall(r'ChIJ[-\w]{20,}', html_content)
-            place_id_matches.extend(direct_place_id_matches)
-            
-            # Pattern 2: "place_id":"ChIJiW5PNgCf4jARFz9UHGvCjT8" (JSON format)
-            json_place_id_matches = re.findall(r'"place_id":\s*"(ChIJ[-\w]{20,})"', html_content)
-            place_id_matches.extend(json_place_id_matches)
-            
-            # Pattern 3: place_id:ChIJiW5PNgCf4jARFz9UHGvCjT8 (colon format)
-            colon_place_id_matches = re.findall(r'place_id:(ChIJ[-\w]{20,})', html_content)
-            place_id_matches.extend(colon_place_id_matches)
-            
-            if place_id_matches:
-                # Remove duplicates and take the first one
-                unique_place_ids = list(set(place_id_matches))
-                place_data['place_id'] = unique_place_ids[0]
-                logger.info(f"✅ Found Place ID: {unique_place_ids[0]}")
-                if len(unique_place_ids) > 1:
-                    logger.info(f"📝 Found multiple Place IDs: {unique_place_ids}")
-            
-            # Look for numeric CID (digits only) - these are different from Place IDs
-            # Try multiple patterns for finding numeric CIDs
-            numeric_cid_matches = []
-            
-            # Pattern 1: cid=1234567890123456789
-            cid_param_matches = re.findall(r'cid=(\d{10,})', html_content)
-            numeric_cid_matches.extend(cid_param_matches)
-            
-            # Pattern 2: "cid":"1234567890123456789" (JSON format)
-            cid_json_matches = re.findall(r'"cid":\s*"(\d{10,})"', html_content)
-            numeric_cid_matches.extend(cid_json_matches)
-            
-            # Pattern 3: cid:1234567890123456789 (colon format)
-            cid_colon_matches = re.findall(r'cid:(\d{10,})', html_content)
-            numeric_cid_matches.extend(cid_colon_matches)
-            
-            if numeric_cid_matches:
-                # Remove duplicates and take the first one
-                unique_cids = list(set(numeric_cid_matches))
-                place_data['numeric_cid'] = unique_cids[0]
-                logger.info(f"✅ Found numeric CID: {unique_cids[0]}")
-                if len(unique_cids) > 1:
-                    logger.info(f"📝 Found multiple CIDs: {unique_cids}")
-            
-            # Look for coordinates
-            coord_matches = re.findall(r'@([-\d.]+),([-\d.]+)', html_content)
-            if coord_matches:
-                for lat, lng in coord_matches:
+            # One pass over the page for Place IDs (ChIJ strings), numeric
+            # CIDs and Bangkok-area coordinates, keeping the first of each.
+            # A Place ID wins outright, so the scan stops at the first one.
+            for match in _RE_LINK_PARTS.finditer(html_content):
+                kind = match.lastgroup
+                if kind == 'place_id':
+                    place_data['place_id'] = match.group('place_id')
+                    logger.info(f"✅ Found Place ID: {place_data['place_id']}")
+                    break
+                if kind == 'cid':
+                    if 'numeric_cid' not in place_data:
+                        place_data['numeric_cid'] = match.group('cid')
+                        logger.info(f"✅ Found numeric CID: {place_data['numeric_cid']}")
+                elif 'lat' not in place_data:
                     try:
-                        lat_val = float(lat)
-                        lng_val = float(lng)
-                        if 13.0 <= lat_val <= 14.0 and 100.0 <= lng_val <= 101.0:  # Bangkok area
-                            place_data['lat'] = lat_val
-                            place_data['lng'] = lng_val
-                            logger.info(f"✅ Found coordinates: {lat_val}, {lng_val}")
-                            break
+                        lat_val = float(match.group('lat'))
+                        lng_val = float(match.group('lng'))
                     except ValueError:
                         continue
+                    if 13.0 <= lat_val <= 14.0 and 100.0 <= lng_val <= 101.0:  # Bangkok area
+                        place_data['lat'] = lat_val
+                        place_data['lng'] = lng_val
+                        logger.info(f"✅ Found coordinates: {lat_val}, {lng_val}")
             
             # Now generate URLs using the correct formats based on ID type
             
@@ -242,10 +260,23 @@ class GoogleMapsProvider(EnrichmentProvider):
 
 
 class MapsStubProvider(EnrichmentProvider):
-    """Deterministic fake enrichment data for testing"""
+    """Deterministic fake enrichment data for testing
+
+    Results are immutable, so each ``(name_raw, city)`` is built once and
+    the same instance is returned for repeated names.
+    """
+    
+    def __init__(self):
+        self._results: Dict[Tuple[str, str], EnrichmentResult] = {}
     
     def enrich(self, name_raw: str, address_raw: str, city: str) -> EnrichmentResult:
         """Return deterministic fake data based on input"""
+        result = self._results.get((name_raw, city))
+        if result is None:
+            result = self._results[(name_raw, city)] = self._build(name_raw, city)
+        return result
+    
+    def _build(self, name_raw: str, city: str) -> EnrichmentResult:
         # Generate deterministic fake data based on name hash
         name_hash = hash(name_raw) % 1000
         
@@ -255,15 +286,7 @@ class MapsStubProvider(EnrichmentProvider):
             price_level=1 + (name_hash % 4),  # 1-4
             lat=13.7563 + (name_hash % 100 - 50) / 1000,  # Bangkok area ±0.05
             lng=100.5018 + (name_hash % 100 - 50) / 1000,
-            hours_json=json.dumps({
-                "monday": "09:00-22:00",
-                "tuesday": "09:00-22:00",
-                "wednesday": "09:00-22:00",
-                "thursday": "09:00-22:00",
-                "friday": "09:00-22:00",
-                "saturday": "09:00-22:00",
-                "sunday": "09:00-22:00"
-            }),
+            hours_json=DAILY_HOURS_JSON,
             site=f"https://example.com/{name_raw.lower().replace(' ', '-')}",
             phone=f"+66 2 {name_hash:03d} {name_hash % 1000:04d}",
             gmap_url=f"https://maps.google.com/maps?q={name_raw.replace(' ', '+')}+{city}"
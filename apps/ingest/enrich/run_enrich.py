@@ -6,27 +6,40 @@ Reads from raw.db, enriches data, and writes to clean.db
 import argparse
 import json
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
-
-from enricher import PlaceEnricher
-from providers.maps_stub import GoogleMapsProvider, MapsStubProvider
+from typing import Dict, List, Optional
 
+from apps.ingest.db_init import ensure_places_name_index
+from apps.ingest.enrich.enricher import EnrichmentResult, PlaceEnricher
+from apps.ingest.enrich.providers.maps_stub import GoogleMapsProvider, MapsStubProvider
 from logger import logger
 
+# Column values that are the same for every enriched place
+EMPTY_PHOTOS_JSON = json.dumps([])
+DEFAULT_VIBE_JSON = json.dumps({
+    'atmosphere': 'mixed',
+    'crowd': 'mixed',
+    'music': 'various'
+})
+
 
 class EnrichmentRunner:
     """Runs the enrichment process"""
     
-    def __init__(self, raw_db: str = "raw.db", clean_db: str = "clean.db", use_google_maps: bool = True):
+    # Concurrent provider lookups; kept small to stay polite to Google Maps
+    ENRICH_WORKERS = 4
+    
+    def __init__(self, raw_db: str = "raw.db", clean_db: str = "clean.db", use_google_maps: bool = True,
+                 gmaps_cache: str = "gmaps_cache.db"):
         self.raw_db = raw_db
         self.clean_db = clean_db
         
         # Choose provider based on preference
         if use_google_maps:
             logger.info("🔍 Using Google Maps provider for real-time enrichment")
-            self.enricher = PlaceEnricher(GoogleMapsProvider())
+            self.enricher = PlaceEnricher(GoogleMapsProvider(gmaps_cache))
         else:
             logger.info("📋 Using stub provider for testing")
             self.enricher = PlaceEnricher(MapsStubProvider())
@@ -100,43 +113,34 @@ class EnrichmentRunner:
         conn.commit()
         conn.close()
     
+    def _enrich_one(self, raw_place: Dict, city: str) -> Optional[EnrichmentResult]:
+        try:
+            return self.enricher.enrich(raw_place['name_raw'], raw_place['address_raw'], city)
+        except Exception as e:
+            logger.error(f"Error enriching {raw_place['name_raw']}: {e}")
+            return None
+    
     def enrich_and_insert(self, raw_places: List[Dict], city: str) -> int:
         """Enrich places and insert into clean_buffer"""
         self.create_clean_buffer_table()
         
-        conn = sqlite3.connect(self.clean_db)
-        cursor = conn.cursor()
+        # Lookups are network-bound and release the GIL, so run them
+        # concurrently; rows are still written from this thread in order
+        with ThreadPoolExecutor(max_workers=self.ENRICH_WORKERS) as executor:
+            enrichments = list(executor.map(lambda place: self._enrich_one(place, city), raw_places))
         
-        inserted_count = 0
-        
-        for raw_place in raw_places:
+        rows = []
+        for raw_place, enrichment in zip(raw_places, enrichments):
+            if enrichment is None:
+                continue
             try:
-                # Enrich the place
-                enrichment = self.enricher.enrich(
-                    raw_place['name_raw'],
-                    raw_place['address_raw'],
-                    city
-                )
-                
                 # Parse raw JSON for additional data
                 raw_data = json.loads(raw_place['raw_json']) if raw_place['raw_json'] else {}
                 
-                # Extract tags and vibe from raw data
+                # Extract tags from raw data
                 tags = raw_data.get('tags', [])
-                vibe = {
-                    'atmosphere': 'mixed',
-                    'crowd': 'mixed',
-                    'music': 'various'
-                }
                 
-                # Insert into clean_buffer
-                cursor.execute('''
-                    INSERT INTO clean_buffer (
-                        name, summary_160, full_description, lat, lng, district, city,
-                        price_level, rating, ratings_count, hours_json, phone, site,
-                        gmap_url, photos_json, tags_json, vibe_json, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
+                rows.append((
                     raw_place['name_raw'],
                     raw_place['description_raw'][:160] if raw_place['description_raw'] else None,
                     raw_place['description_raw'],
@@ -151,35 +155,41 @@ class EnrichmentRunner:
                     enrichment.phone,
                     enrichment.site,
                     enrichment.gmap_url,
-                    json.dumps([]),  # photos_json - empty for now
+                    EMPTY_PHOTOS_JSON,  # photos_json - empty for now
                     json.dumps(tags),
-                    json.dumps(vibe),
+                    DEFAULT_VIBE_JSON,
                     datetime.now().isoformat()
                 ))
                 
-                inserted_count += 1
-                
             except Exception as e:
                 logger.error(f"Error enriching {raw_place['name_raw']}: {e}")
                 continue
         
+        # Insert into clean_buffer in one statement and one transaction
+        conn = sqlite3.connect(self.clean_db)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executemany('''
+            INSERT INTO clean_buffer (
+                name, summary_160, full_description, lat, lng, district, city,
+                price_level, rating, ratings_count, hours_json, phone, site,
+                gmap_url, photos_json, tags_json, vibe_json, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
         conn.commit()
         conn.close()
         
-        return inserted_count
+        return len(rows)
     
     def upsert_to_places(self) -> int:
-        """Upsert from clean_buffer to places table"""
+        """Upsert from clean_buffer to places table, returning rows inserted or updated"""
         conn = sqlite3.connect(self.clean_db)
+        ensure_places_name_index(conn)
         cursor = conn.cursor()
         
-        # Get count before upsert
-        cursor.execute('SELECT COUNT(*) FROM places')
-        count_before = cursor.fetchone()[0]
-        
-        # Upsert from buffer to places (using name as unique key)
+        # Upsert from buffer to places (using name as unique key); existing
+        # rows are updated in place so their ids and index entries are kept
         cursor.execute('''
-            INSERT OR REPLACE INTO places (
+            INSERT INTO places (
                 name, summary_160, full_description, lat, lng, district, city,
                 price_level, rating, ratings_count, hours_json, phone, site,
                 gmap_url, photos_json, tags_json, vibe_json, updated_at, quality_score
@@ -190,11 +200,27 @@ class EnrichmentRunner:
                 gmap_url, photos_json, tags_json, vibe_json, updated_at, 0.8
             FROM clean_buffer
             WHERE name IS NOT NULL AND name != ''
+            ON CONFLICT(name) DO UPDATE SET
+                summary_160 = excluded.summary_160,
+                full_description = excluded.full_description,
+                lat = excluded.lat,
+                lng = excluded.lng,
+                district = excluded.district,
+                city = excluded.city,
+                price_level = excluded.price_level,
+                rating = excluded.rating,
+                ratings_count = excluded.ratings_count,
+                hours_json = excluded.hours_json,
+                phone = excluded.phone,
+                site = excluded.site,
+                gmap_url = excluded.gmap_url,
+                photos_json = excluded.photos_json,
+                tags_json = excluded.tags_json,
+                vibe_json = excluded.vibe_json,
+                updated_at = excluded.updated_at,
+                quality_score = excluded.quality_score
         ''')
-        
-        # Get count after upsert
-        cursor.execute('SELECT COUNT(*) FROM places')
-        count_after = cursor.fetchone()[0]
+        upserted = cursor.rowcount
         
         # Clear buffer
         cursor.execute('DELETE FROM clean_buffer')
@@ -202,7 +228,7 @@ class EnrichmentRunner:
         conn.commit()
         conn.close()
         
-        return count_after - count_before
+        return upserted
     
     def run(self, limit: int, city: str) -> Dict[str, int]:
         """Main enrichment process"""
@@ -233,6 +259,7 @@ def main():
     parser.add_argument("--city", default="bangkok", help="City for enrichment (default: bangkok)")
     parser.add_argument("--raw-db", default="raw.db", help="Raw database path (default: raw.db)")
     parser.add_argument("--clean-db", default="clean.db", help="Clean database path (default: clean.db)")
+    parser.add_argument("--gmaps-cache", default="gmaps_cache.db", help="Google Maps lookup cache path (default: gmaps_cache.db)")
     
     args = parser.parse_args()
     
@@ -249,7 +276,7 @@ def main():
     use_google_maps = True  # Default to Google Maps
     
     # Run enrichment
-    runner = EnrichmentRunner(args.raw_db, args.clean_db, use_google_maps)
+    runner = EnrichmentRunner(args.raw_db, args.clean_db, use_google_maps, args.gmaps_cache)
     results = runner.run(args.limit, args.city)
     
     logger.info("\n✅ Enrichment completed!")
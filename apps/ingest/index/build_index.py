@@ -6,8 +6,7 @@ Rebuilds all search indices from clean.places
 import argparse
 from pathlib import Path
 
-from indexer import SearchIndexer
-
+from apps.ingest.index.indexer import SearchIndexer
 from logger import logger
 
 
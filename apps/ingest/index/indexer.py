@@ -8,6 +8,7 @@ import json
 import sqlite3
 from typing import Any, Dict, List, Optional, Tuple, cast  # noqa: F401
 
+from apps.ingest.db_init import migrate_fts_places
 from packages.search.provider import LocalSearchProvider
 
 
@@ -70,8 +71,9 @@ class SearchIndexer:
         conn = sqlite3.connect(self.clean_db)
         cursor = conn.cursor()
         
-        # Clear FTS5 table
-        pass
+        # Clear FTS5 table, first replacing a legacy contentless one
+        migrate_fts_places(conn)
+        cursor.execute('DELETE FROM fts_places')
         
         # Clear embeddings table
         cursor.execute('DELETE FROM embeddings')
@@ -94,23 +96,18 @@ class SearchIndexer:
         # Import search provider
         provider = LocalSearchProvider(self.clean_db)
         
-        indexed_count = 0
+        # Index all places in one transaction
+        indexed_count = provider.index_many(
+            (place['id'], self.build_fts_text(place)) for place in places
+        )
+        if places and not indexed_count:
+            print(f"❌ Failed to index {len(places)} places")
         
-        for place in places:
-            try:
-                # Build FTS text
-                fts_text = self.build_fts_text(place)
-                
-                # Index the place
-                if provider.index(place['id'], fts_text):
-                    indexed_count += 1
-                    print(f"✅ Indexed: {place['name']}")
-                else:
-                    print(f"❌ Failed to index: {place['name']}")
-                    
-            except Exception as e:
-                print(f"❌ Error indexing {place['name']}: {e}")
-                continue
+        # Merge FTS5 segments so ranked queries read one b-tree
+        conn = sqlite3.connect(self.clean_db)
+        conn.execute("INSERT INTO fts_places (fts_places) VALUES ('optimize')")
+        conn.commit()
+        conn.close()
         
         print(f"✅ Indexing completed: {indexed_count} places indexed")
         
@@ -2,8 +2,13 @@ from __future__ import annotations
 
 import os
 import sqlite3
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Tuple, cast  # noqa: F401
+from array import array
+from functools import lru_cache
+from operator import mul
+from typing import Any, Dict, Iterable, List, Optional, Tuple, cast  # noqa: F401
 
 from logger import logger
 
@@ -27,15 +32,62 @@ class SearchProvider(ABC):
         pass
 
 class LocalSearchProvider(SearchProvider):
-    """Local search provider using FTS5 + deterministic embeddings"""
+    """Local search provider using FTS5 + deterministic embeddings
+
+    ``fts`` and ``knn`` results are memoized per ``(query, top_k)`` for at
+    most ``SEARCH_CACHE_TTL_S`` seconds, so an index rebuilt by another
+    process is picked up without a restart. Indexing through this provider
+    clears them at once, as does ``clear_search_cache``.
+    """
+
+    SEARCH_CACHE_SIZE = 1024
+    SEARCH_CACHE_TTL_S = 60
 
     def __init__(self, db_path: Optional[str] = None) -> None:
         env_db = os.getenv("DB_PATH", "./data/clean.db")
         self.db_path: str = db_path if db_path is not None else env_db
         self.embedding_dim = 64  # Fixed dimension for deterministic vectors
+        self._local = threading.local()
+        self._conns_lock = threading.Lock()
+        self._conns: List[sqlite3.Connection] = []
+        self._fts_cached = lru_cache(maxsize=self.SEARCH_CACHE_SIZE)(self._fts_query)
+        self._knn_cached = lru_cache(maxsize=self.SEARCH_CACHE_SIZE)(self._knn_query)
+        self._embedding_matrix = lru_cache(maxsize=1)(self._load_embeddings)
+
+    def _cache_epoch(self) -> int:
+        # Memoized calls take the epoch as an argument, so entries from an
+        # earlier SEARCH_CACHE_TTL_S window are never hit again.
+        return int(time.monotonic()) // self.SEARCH_CACHE_TTL_S
+
+    def clear_search_cache(self) -> None:
+        self._fts_cached.cache_clear()
+        self._knn_cached.cache_clear()
+        self._embedding_matrix.cache_clear()
 
     def _connect(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        """Return this thread's connection, opening it on first use.
+
+        Callers use it as ``with self._connect() as conn``, which commits or
+        rolls back but keeps the connection open for the next call.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Used only by this thread, but closed from whichever calls close()
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA cache_size=-64000")
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close every thread's connection"""
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            conn.close()
+        self._local = threading.local()
     
     def _compute_embedding(self, text: str) -> bytes:
         """Compute deterministic embedding using char n-gram hashing trick"""
@@ -83,11 +135,11 @@ class LocalSearchProvider(SearchProvider):
             with self._connect() as conn:
                 cursor = conn.cursor()
 
-                # Insert into FTS5
+                # Insert into FTS5 under the document's id
                 cursor.execute('''
-                    INSERT OR REPLACE INTO fts_places (name, summary_160, tags)
-                    VALUES (?, ?, ?)
-                ''', (text, text, text))
+                    INSERT OR REPLACE INTO fts_places (rowid, name, summary_160, tags)
+                    VALUES (?, ?, ?, ?)
+                ''', (doc_id, text, text, text))
 
                 # Compute and store embedding
                 embedding = self._compute_embedding(text)
@@ -97,58 +149,115 @@ class LocalSearchProvider(SearchProvider):
                 ''', (doc_id, embedding, self.embedding_dim))
 
                 conn.commit()
+                self.clear_search_cache()
                 return True
             
         except Exception as e:
             logger.error(f"Error indexing doc {doc_id}: {e}")
             return False
     
-    def knn(self, query_text: str, top_k: int) -> List[Tuple[int, float]]:
-        """Find top-k most similar documents using k-NN on embeddings"""
+    def index_many(self, docs: Iterable[Tuple[int, str]]) -> int:
+        """Index many ``(doc_id, text)`` pairs in a single transaction"""
+        docs = list(docs)
         try:
             with self._connect() as conn:
                 cursor = conn.cursor()
 
-                # Get query embedding
-                query_embedding = self._compute_embedding(query_text)
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO fts_places (rowid, name, summary_160, tags)
+                    VALUES (?, ?, ?, ?)
+                ''', ((doc_id, text, text, text) for doc_id, text in docs))
 
-                # Get all document embeddings
-                cursor.execute('SELECT doc_id, vector FROM embeddings')
-                embeddings = cursor.fetchall()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO embeddings (doc_id, vector, dim)
+                    VALUES (?, ?, ?)
+                ''', (
+                    (doc_id, self._compute_embedding(text), self.embedding_dim)
+                    for doc_id, text in docs
+                ))
 
-                # Compute similarities
-                similarities = []
-                for doc_id, vec_bytes in embeddings:
-                    similarity = self._cosine_similarity(query_embedding, vec_bytes)
-                    similarities.append((doc_id, similarity))
+                conn.commit()
+                self.clear_search_cache()
+                return len(docs)
 
-                # Sort by similarity (descending) and return top-k
-                similarities.sort(key=lambda x: x[1], reverse=True)
+        except Exception as e:
+            logger.error(f"Error bulk indexing {len(docs)} docs: {e}")
+            return 0
 
-                return similarities[:top_k]
-            
+    def knn(self, query_text: str, top_k: int) -> List[Tuple[int, float]]:
+        """Find top-k most similar documents using k-NN on embeddings"""
+        try:
+            return list(self._knn_cached(query_text, top_k, self._cache_epoch()))
         except Exception as e:
             logger.error(f"Error in kNN search: {e}")
             return []
-    
-    def fts(self, query: str, top_k: int) -> List[Tuple[int, float]]:
-        """Full-text search using FTS5"""
-        try:
-            with self._connect() as conn:
-                cursor = conn.cursor()
 
-                cursor.execute('''
-                    SELECT rowid, rank FROM fts_places
-                    WHERE fts_places MATCH ?
-                    ORDER BY rank
-                    LIMIT ?
-                ''', (query, top_k))
+    def _load_embeddings(self, epoch: int) -> Tuple[Tuple[int, ...], array]:
+        """Read every embedding into one packed float32 array, row per doc"""
+        doc_ids = []
+        matrix = array('f')
+        with self._connect() as conn:
+            for doc_id, vec_bytes in conn.execute('SELECT doc_id, vector FROM embeddings'):
+                doc_ids.append(doc_id)
+                matrix.frombytes(vec_bytes)
+        return tuple(doc_ids), matrix
 
-                results = cursor.fetchall()
+    def _knn_query(self, query_text: str, top_k: int, epoch: int) -> Tuple[Tuple[int, float], ...]:
+        # Document vectors are loaded once per epoch and reused until then
+        doc_ids, matrix = self._embedding_matrix(epoch)
+        query = array('f', self._compute_embedding(query_text)).tolist()
+        dim = self.embedding_dim
 
-                # Convert rank to similarity score (lower rank = higher score)
-                return [(doc_id, 1.0 / (rank + 1)) for doc_id, rank in results]
-            
+        # Dot products equal cosine similarity since vectors are normalized
+        similarities = [
+            (doc_id, sum(map(mul, query, matrix[row * dim:(row + 1) * dim])))
+            for row, doc_id in enumerate(doc_ids)
+        ]
+
+        # Sort by similarity (descending) and return top-k
+        similarities.sort(key=lambda x: x[1], reverse=True)
+
+        return tuple(similarities[:top_k])
+
+    def fts(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Full-text search using FTS5"""
+        try:
+            return list(self._fts_cached(query, top_k, self._cache_epoch()))
         except Exception as e:
             logger.error(f"Error in FTS search: {e}")
             return []
+
+    def _fts_query(self, query: str, top_k: int, epoch: int) -> Tuple[Tuple[int, float], ...]:
+        with self._connect() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT rowid, rank FROM fts_places
+                WHERE fts_places MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            ''', (query, top_k))
+
+            results = cursor.fetchall()
+
+            # Convert rank to similarity score (lower rank = higher score)
+            return tuple((doc_id, 1.0 / (rank + 1)) for doc_id, rank in results)
+
+
+def reciprocal_rank_fusion(
+    *rankings: Iterable[Tuple[int, float]],
+    k: int = 60,
+    limit: Optional[int] = None,
+) -> List[int]:
+    """Merge ranked ``(doc_id, score)`` lists into one ranked id list
+
+    Each document scores ``sum(1 / (k + rank))`` over the lists it appears
+    in, so ids found by several providers rise to the top. Ties keep the
+    order in which ids were first seen.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _score) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    ordered = sorted(fused, key=fused.__getitem__, reverse=True)
+    return ordered if limit is None else ordered[:limit]
@@ -7,5 +7,6 @@ echo ""
 echo "Press Ctrl+C to stop the server"
 echo ""
 
-cd apps/api
-python main.py
+# Run from the repository root so the apps/packages imports resolve
+cd "$(dirname "$0")/.."
+uvicorn --factory apps.api.main:create_app --host 0.0.0.0 --port 8000
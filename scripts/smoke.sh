@@ -56,8 +56,8 @@ fi
 
 # Step 3: Enrich places data
 print_step "3" "Enrich places data with external APIs (limit: 5)"
-echo "Running: python apps/ingest/enrich/run_enrich.py --limit 5 --city bangkok"
-if python3 apps/ingest/enrich/run_enrich.py --limit 5 --city bangkok; then
+echo "Running: python -m apps.ingest.enrich.run_enrich --limit 5 --city bangkok"
+if python3 -m apps.ingest.enrich.run_enrich --limit 5 --city bangkok; then
     print_status "success" "Places data enriched successfully"
 else
     print_status "error" "Places enrichment failed"
@@ -66,8 +66,8 @@ fi
 
 # Step 4: Normalize data
 print_step "4" "Normalize and clean data (limit: 10)"
-echo "Running: python apps/ingest/normalize/normalizer.py --limit 10"
-if python3 apps/ingest/normalize/normalizer.py --limit 10; then
+echo "Running: python -m apps.ingest.normalize.normalizer --limit 10"
+if python3 -m apps.ingest.normalize.normalizer --limit 10; then
     print_status "success" "Data normalization completed successfully"
 else
     print_status "error" "Data normalization failed"
@@ -76,8 +76,8 @@ fi
 
 # Step 5: Build search indices
 print_step "5" "Build search indices (FTS5 + embeddings)"
-echo "Running: python apps/ingest/index/build_index.py"
-if python3 apps/ingest/index/build_index.py; then
+echo "Running: python -m apps.ingest.index.build_index"
+if python3 -m apps.ingest.index.build_index; then
     print_status "success" "Search indices built successfully"
 else
     print_status "error" "Search index building failed"
@@ -110,7 +110,7 @@ fi
 print_step "7" "Start API server"
 echo "To start the API server, run this command in a separate terminal:"
 echo ""
-echo "   cd apps/api && python3 main.py"
+echo "   uvicorn --factory apps.api.main:create_app --reload"
 echo ""
 echo "Waiting for API to be available..."
 
@@ -131,7 +131,7 @@ if [ $COUNTER -eq $TIMEOUT ]; then
     print_status "warning" "API server not detected. Please start it manually and continue."
     echo ""
     echo "Manual API start command:"
-    echo "   cd apps/api && python3 main.py"
+    echo "   uvicorn --factory apps.api.main:create_app --reload"
     echo ""
     read -p "Press Enter when API is running, or Ctrl+C to exit..."
 fi
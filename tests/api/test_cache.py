@@ -0,0 +1,237 @@
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+
+from apps.api.cache import (
+    CachedPayload,
+    CacheManager,
+    MemoryTTLCache,
+    SnapshotCache,
+    SQLiteCache,
+    payload_etag,
+)
+
+
+def test_sqlite_cache_roundtrip_and_cleanup(tmp_path: Path) -> None:
+    cache = SQLiteCache(str(tmp_path / "cache.db"))
+    try:
+        cache.set("fresh", b'{"routes":[1,2,3]}')
+        cache.set("stale", b'{"routes":[]}', ttl_days=-1)
+
+        assert cache.get("fresh") == b'{"routes":[1,2,3]}'
+        assert cache.get("stale") is None
+        assert cache.get("missing") is None
+        assert cache.cleanup() == 1
+    finally:
+        cache.close()
+
+
+def test_sqlite_cache_uses_wal(tmp_path: Path) -> None:
+    cache = SQLiteCache(str(tmp_path / "cache.db"))
+    try:
+        mode = cache._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        assert mode == "wal"
+    finally:
+        cache.close()
+
+
+def test_cache_manager_promotes_sqlite_hit_to_memory(tmp_path: Path) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        manager.sqlite.set("k", b'{"v":1}')
+        entry, status, store = manager.get("k")
+        assert entry is not None
+        assert (entry.body, status, store) == (b'{"v":1}', "HIT", "sqlite")
+        assert manager.memory.get("k") == entry
+        assert manager.get("other") == (None, "MISS", "-")
+    finally:
+        manager.close()
+
+
+def test_memory_cache_evicts_least_recently_used() -> None:
+    cache = MemoryTTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" becomes most recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert len(cache.cache) == 2
+
+
+def test_build_cache_key_is_order_independent(tmp_path: Path) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        key = manager.build_cache_key("Bangkok", "2025-09-01", "Lazy", ["walk", "rooftop"], 13.7563, 100.5018)
+        same = manager.build_cache_key("bangkok", "2025-09-01", "lazy", ["rooftop", "walk"], 13.7563, 100.5018)
+        nearby = manager.build_cache_key("bangkok", "2025-09-01", "lazy", ["walk", "rooftop"], 13.75634, 100.50181)
+        assert key == same == nearby == "rec:bangkok:2025-09-01:lazy:rooftop,walk:13756:100501"
+    finally:
+        manager.close()
+
+
+def test_cache_manager_persists_writes_in_background(tmp_path: Path) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        for i in range(10):
+            manager.set(f"k{i}", {"i": i})
+        manager.flush()
+        assert manager.sqlite.get("k9") == b'{"i":9}'
+    finally:
+        manager.close()
+
+
+def test_cache_manager_returns_serialized_payload(tmp_path: Path) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        manager.set("k", {"routes": [{"steps": [1, 2, 3]}], "alternatives": {}})
+        entry, status, store = manager.get("k")
+        assert entry is not None
+        assert (status, store) == ("HIT", "memory")
+        assert entry.body == b'{"routes":[{"steps":[1,2,3]}],"alternatives":{}}'
+    finally:
+        manager.close()
+
+
+def test_sqlite_cache_migrates_legacy_rowid_table(tmp_path: Path) -> None:
+    db_path = tmp_path / "cache.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expire_ts REAL NOT NULL)")
+        conn.execute("INSERT INTO cache VALUES ('k', '{\"v\":1}', ?)", (time.time() + 60,))
+
+    cache = SQLiteCache(str(db_path))
+    try:
+        ddl = cache._conn.execute("SELECT sql FROM sqlite_master WHERE name = 'cache'").fetchone()[0]
+        assert "WITHOUT ROWID" in ddl
+        assert cache.get("k") == b'{"v":1}'
+    finally:
+        cache.close()
+
+
+def test_sqlite_cache_compresses_large_payloads(tmp_path: Path) -> None:
+    cache = SQLiteCache(str(tmp_path / "cache.db"))
+    try:
+        payload = b'{"routes":[' + b",".join(b'{"id":%d}' % i for i in range(500)) + b"]}"
+        cache.set("big", payload)
+        stored = cache._conn.execute("SELECT value FROM cache WHERE key = 'big'").fetchone()[0]
+        assert len(stored) < len(payload)
+        assert cache.get("big") == payload
+    finally:
+        cache.close()
+
+
+def test_cache_manager_set_invalidates_hot_lookups(tmp_path: Path) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        assert manager.get("k") == (None, "MISS", "-")
+        first = manager.set_payload("k", b'{"v":1}')
+        assert manager.get("k") == (first, "HIT", "memory")
+        second = manager.set_payload("k", b'{"v":2}')
+        assert manager.get("k") == (second, "HIT", "memory")
+        assert first.etag != second.etag
+    finally:
+        manager.close()
+
+
+def test_cache_manager_does_not_memoize_misses(tmp_path: Path) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        assert manager.get("k") == (None, "MISS", "-")
+        # Written without clearing the hot-key LRU, as in a concurrent set
+        entry = CachedPayload.build(b'{"v":1}', time.time() + 60)
+        manager.memory.set("k", entry)
+        assert manager.get("k") == (entry, "HIT", "memory")
+    finally:
+        manager.close()
+
+
+def test_cache_manager_gc_removes_expired_rows(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(CacheManager, "GC_INTERVAL_S", 0.01)
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        manager.sqlite.set("stale", b"{}", ttl_days=-1)
+
+        def remaining() -> int:
+            with manager.sqlite._lock:
+                return manager.sqlite._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+        deadline = time.monotonic() + 2
+        while remaining() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert remaining() == 0
+    finally:
+        manager.close()
+
+
+def test_cache_manager_treats_sqlite_errors_as_miss(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        def locked(key: str) -> bytes:
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(manager.sqlite, "get", locked)
+        assert manager.get("k") == (None, "MISS", "-")
+    finally:
+        manager.close()
+
+
+def test_snapshot_cache_roundtrip(tmp_path: Path) -> None:
+    path = str(tmp_path / "hot.pack")
+    now = time.time()
+    items = [(f"k{i}", b'{"i":%d}' % i, now + 60) for i in range(50)]
+    assert SnapshotCache.write(path, items + [("old", b"{}", now - 1)]) == 51
+
+    snapshot = SnapshotCache(path)
+    try:
+        assert snapshot.get("k0") == b'{"i":0}'
+        assert snapshot.get("k49") == b'{"i":49}'
+        assert snapshot.get("old") is None
+        assert snapshot.get("missing") is None
+    finally:
+        snapshot.close()
+
+
+def test_snapshot_cache_ignores_truncated_pack(tmp_path: Path) -> None:
+    path = str(tmp_path / "hot.pack")
+    SnapshotCache.write(path, [(f"k{i}", b"{}", time.time() + 60) for i in range(10)])
+    data = Path(path).read_bytes()
+
+    for size in (3, SnapshotCache._HEADER.size + 10):
+        Path(path).write_bytes(data[:size])
+        snapshot = SnapshotCache(path)
+        assert snapshot.get("k0") is None
+        snapshot.close()
+
+
+def test_cache_manager_serves_hits_from_snapshot(tmp_path: Path) -> None:
+    snapshot_path = str(tmp_path / "hot.pack")
+    writer = CacheManager(sqlite_db_path=str(tmp_path / "a.db"), snapshot_path=snapshot_path)
+    try:
+        writer.set("k", {"v": 1})
+        assert writer.write_snapshot() == 1
+    finally:
+        writer.close()
+
+    reader = CacheManager(sqlite_db_path=str(tmp_path / "b.db"), snapshot_path=snapshot_path)
+    try:
+        entry, status, store = reader.get("k")
+        assert entry is not None
+        assert (entry.body, status, store) == (b'{"v":1}', "HIT", "snapshot")
+        assert reader.memory.get("k") == entry
+    finally:
+        reader.close()
+
+
+def test_cached_payload_carries_etag_and_remaining_ttl(tmp_path: Path) -> None:
+    manager = CacheManager(sqlite_db_path=str(tmp_path / "cache.db"))
+    try:
+        entry = manager.set_payload("k", b'{"v":1}', ttl_days=1)
+        assert entry.etag == payload_etag(b'{"v":1}')
+        assert 24 * 3600 - 5 <= entry.max_age() <= 24 * 3600
+        assert CachedPayload.build(b"{}", time.time() - 1).max_age() == 0
+    finally:
+        manager.close()
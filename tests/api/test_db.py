@@ -0,0 +1,44 @@
+import threading
+from pathlib import Path
+
+from apps.api.db import ConnectionPool
+
+
+def test_connection_pool_reuses_connection_per_thread(tmp_path: Path) -> None:
+    pool = ConnectionPool(str(tmp_path / "clean.db"))
+    try:
+        conn = pool.get()
+        assert pool.get() is conn
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(pool.get()))
+        thread.start()
+        thread.join()
+        assert other[0] is not conn
+    finally:
+        pool.close()
+
+
+def test_fetch_candidates_tops_up_small_id_lists(tmp_path: Path) -> None:
+    from apps.api.main import fetch_candidates
+    from apps.ingest.db_init import init_clean_db, seed_mock_data
+
+    db_path = tmp_path / "clean.db"
+    init_clean_db(db_path)
+    seed_mock_data(db_path)
+    pool = ConnectionPool(str(db_path))
+    try:
+        conn = pool.get()
+        ids = [row["id"] for row in conn.execute("SELECT id FROM places ORDER BY id DESC")]
+        first_three = {row["id"] for row in conn.execute("SELECT id FROM places LIMIT 3")}
+
+        candidates = fetch_candidates(conn, ids)
+        assert sorted(c["id"] for c in candidates) == sorted(ids)
+        assert isinstance(candidates[0]["tags_json"], list)
+        assert candidates[0]["tags_lc"] == {tag.lower() for tag in candidates[0]["tags_json"]}
+
+        topped_up = fetch_candidates(conn, ids[:1])
+        assert {c["id"] for c in topped_up} == first_three | {ids[0]}
+    finally:
+        pool.close()
@@ -1,6 +1,5 @@
-import os
-import uuid
-from importlib import reload
+import time
+from pathlib import Path
 from typing import Any, Dict, Iterator
 
 import pytest
@@ -11,17 +10,14 @@ pytest.importorskip("fastapi")
 
 @pytest.fixture(scope="module")
 def client(tmp_path_factory: pytest.TempPathFactory) -> Iterator[TestClient]:
-    db_path = tmp_path_factory.mktemp("db") / f"{uuid.uuid4().hex}.db"
-    os.environ["DB_PATH"] = str(db_path)
+    """One seeded database and app shared by every test in this module."""
+    from apps.api.main import create_app
+    from apps.api.settings import Settings
 
-    from apps.api import main
-    reload(main)
-    with TestClient(main.app) as client:
+    db_path = tmp_path_factory.mktemp("db") / "clean.db"
+    with TestClient(create_app(Settings(db_path=str(db_path)))) as client:
         yield client
 
-    if db_path.exists():
-        db_path.unlink()
-
 
 def test_health_endpoint(client: TestClient) -> None:
     response = client.get("/api/health")
@@ -85,3 +81,162 @@ def test_recommend_places_missing_params(client: TestClient) -> None:
     }
     resp = client.get("/api/places/recommend", params=params)
     assert resp.status_code == 422
+
+
+def test_recommend_places_cache_hit_returns_same_body(client: TestClient) -> None:
+    params: Dict[str, Any] = {
+        "vibe": "cozy",
+        "intents": "thai,park,rooftop",
+        "lat": 13.7563,
+        "lng": 100.5018,
+    }
+    first = client.get("/api/places/recommend", params=params)
+    second = client.get("/api/places/recommend", params=params)
+    assert first.status_code == second.status_code == 200
+    assert second.headers["X-Cache-Status"] == "HIT"
+    assert second.headers["content-type"] == "application/json"
+    assert second.json() == first.json()
+
+
+def test_recommend_places_honours_if_none_match(client: TestClient) -> None:
+    params: Dict[str, Any] = {
+        "vibe": "lazy",
+        "intents": "thai,park,rooftop",
+        "lat": 13.7563,
+        "lng": 100.5018,
+    }
+    first = client.get("/api/places/recommend", params=params)
+    etag = first.headers["ETag"]
+    # max-age is the entry's remaining TTL (7 days by default)
+    max_age = int(first.headers["Cache-Control"].removeprefix("max-age="))
+    assert 7 * 24 * 3600 - 60 < max_age <= 7 * 24 * 3600
+
+    revalidated = client.get("/api/places/recommend", params=params, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    assert revalidated.headers["ETag"] == etag
+
+
+def test_warm_cache_matches_recommend(client: TestClient) -> None:
+    day = "2025-09-01"
+    warm = client.get(
+        "/api/cache/warm",
+        params={"city": "bangkok", "day": day, "combos": "chill:thai,park,rooftop|bad-combo"},
+    )
+    assert warm.status_code == 200
+    data = warm.json()
+    assert data["combos_processed"] == 2
+    assert data["warmed"] == 1
+    assert data["keys"][0].startswith(f"rec:bangkok:{day}:chill:")
+
+
+def test_invalidate_cache_clears_search_memo(client: TestClient) -> None:
+    search_provider = client.app.state.search_provider  # type: ignore[attr-defined]
+    search_provider.fts("park", 5)
+    assert search_provider._fts_cached.cache_info().currsize > 0
+
+    response = client.post("/api/cache/invalidate")
+    assert response.status_code == 200
+    assert response.json() == {"cleared": ["search"]}
+    assert search_provider._fts_cached.cache_info().currsize == 0
+
+
+def test_submit_feedback(client: TestClient) -> None:
+    first = client.post("/api/feedback", json={"route": [1, 2, 3], "useful": True})
+    second = client.post("/api/feedback", json={"route": [3, 2, 1], "useful": False, "note": "too far"})
+    assert first.status_code == second.status_code == 200
+    assert second.json()["id"] == first.json()["id"] + 1
+    assert second.json()["note"] == "too far"
+
+
+def test_today_str_matches_local_date() -> None:
+    from datetime import datetime
+
+    from apps.api.main import today_str
+
+    assert today_str() == datetime.now().strftime("%Y-%m-%d")
+    assert today_str() is today_str()
+
+
+def test_startup_prefills_cache_from_manifest(tmp_path: Path) -> None:
+    from apps.api.main import create_app, today_str
+    from apps.api.settings import Settings
+
+    manifest = tmp_path / "warm.json"
+    manifest.write_text('[{"city": "bangkok", "combos": "chill:thai,park,rooftop"}]')
+    config = Settings(db_path=str(tmp_path / "clean.db"), warm_manifest_path=str(manifest))
+    app = create_app(config)
+    cache_manager = app.state.cache_manager
+    key = cache_manager.build_cache_key("bangkok", today_str(), "chill", ["thai", "park", "rooftop"], 13.7563, 100.5018)
+    with TestClient(app) as client:
+        deadline = time.monotonic() + 5
+        while cache_manager.memory.get(key) is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        response = client.get(
+            "/api/places/recommend",
+            params={
+                "vibe": "chill",
+                "intents": "thai,park,rooftop",
+                "lat": 13.7563,
+                "lng": 100.5018,
+            },
+        )
+    assert response.status_code == 200
+    assert response.headers["X-Cache-Status"] == "HIT"
+
+
+def test_prefill_skips_invalid_manifest_entries(tmp_path: Path) -> None:
+    from apps.api.main import create_app
+    from apps.api.settings import Settings
+
+    manifest = tmp_path / "warm.json"
+    manifest.write_text('[{"combos": "chill:thai"}, "junk", {"city": "bangkok", "combos": "chill:thai,park,rooftop"}]')
+    app = create_app(Settings(db_path=str(tmp_path / "clean.db"), warm_manifest_path=str(manifest)))
+    with TestClient(app):
+        prefill = app.state.prefill_task
+        deadline = time.monotonic() + 5
+        while not prefill.done() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert prefill.result() == 1
+    assert not app.state.feedback_writer._writer.is_alive()
+
+
+def test_shutdown_closes_resources_when_prefill_fails(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    from apps.api import main
+    from apps.api.settings import Settings
+
+    async def broken_prefill(state: Any, manifest_path: str) -> int:
+        raise KeyError("city")
+
+    monkeypatch.setattr(main, "prefill_cache", broken_prefill)
+    app = main.create_app(Settings(db_path=str(tmp_path / "clean.db"), warm_manifest_path="warm.json"))
+    with TestClient(app):
+        pass
+    assert not app.state.feedback_writer._writer.is_alive()
+    assert not app.state.cache_manager._writer.is_alive()
+
+
+def test_build_alternatives_ranks_by_tag_overlap() -> None:
+    from apps.api.main import build_alternatives
+
+    by_id: Dict[int, Dict[str, Any]] = {
+        1: {"name": "a", "tags_json": ["thai"]},
+        2: {"name": "b", "tags_json": ["park", "walk"]},
+        3: {"name": "c", "tags_json": ["bar"]},
+        4: {"name": "d", "tags_json": ["park", "bar"]},
+        5: {"name": "e", "tags_json": ["walk", "park"]},
+        6: {"name": "f", "tags_json": ["spa"]},
+    }
+    route = {"steps": [1, 2, 3]}
+    alternatives = build_alternatives(by_id, route)
+    assert [alt["id"] for alt in alternatives["step2"]] == [5, 4]
+    assert alternatives["step2"][1]["similarity"] == 0.5
+    assert build_alternatives(by_id, route, threshold=1.0) == {}
+
+
+def test_fetch_candidates_keeps_ranked_order(client: TestClient) -> None:
+    from apps.api.main import fetch_candidates
+
+    conn = client.app.state.db.get()  # type: ignore[attr-defined]
+    assert [c["id"] for c in fetch_candidates(conn, [3, 1, 2])] == [3, 1, 2]
+    assert [c["id"] for c in fetch_candidates(conn, [2])] == [2, 1, 3]
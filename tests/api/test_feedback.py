@@ -0,0 +1,39 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from apps.api.feedback import FeedbackWriter
+from apps.ingest.db_init import FEEDBACK_TABLE_DDL
+
+
+def test_feedback_writer_returns_row_ids_for_concurrent_submissions(tmp_path: Path) -> None:
+    db_path = tmp_path / "clean.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(FEEDBACK_TABLE_DDL)
+
+    writer = FeedbackWriter(str(db_path))
+    try:
+        rows = [("2025-01-01T00:00:00", f"[{i}]", i % 2 == 0, None) for i in range(50)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(writer.submit, rows))
+    finally:
+        writer.close()
+
+    assert sorted(ids) == list(range(1, 51))
+    with sqlite3.connect(db_path) as conn:
+        stored = dict(conn.execute("SELECT id, route_json FROM feedback"))
+    assert all(stored[row_id] == row[1] for row_id, row in zip(ids, rows))
+
+
+def test_feedback_writer_rejects_submissions_after_close(tmp_path: Path) -> None:
+    db_path = tmp_path / "clean.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(FEEDBACK_TABLE_DDL)
+
+    writer = FeedbackWriter(str(db_path))
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.submit(("2025-01-01T00:00:00", "[1]", True, None))
+    writer.close()
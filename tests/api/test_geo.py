@@ -0,0 +1,56 @@
+import pytest
+
+from apps.api.geo import haversine_rad, to_radians
+
+
+def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    (lat_r,), (lng_r,), (cos_lat,) = to_radians([lat1], [lng1])
+    return haversine_rad(lat_r, lng_r, cos_lat, *to_radians([lat2], [lng2]))[0]
+
+
+def test_haversine_rad_known_value() -> None:
+    # Grand Palace to Wat Arun, roughly 1 km across the river.
+    assert haversine_distance(13.7500, 100.4913, 13.7437, 100.4888) == pytest.approx(752, abs=5)
+    assert haversine_distance(13.75, 100.5, 13.75, 100.5) == 0
+
+
+def test_haversine_rad_matches_pointwise() -> None:
+    lats = [13.7563, 13.7469, 13.7308, 13.8000]
+    lngs = [100.5018, 100.5350, 100.5697, 100.4500]
+    (lat_r,), (lng_r,), (cos_lat,) = to_radians([13.75], [100.5])
+    distances = haversine_rad(lat_r, lng_r, cos_lat, *to_radians(lats, lngs))
+    expected = [haversine_distance(13.75, 100.5, la, ln) for la, ln in zip(lats, lngs)]
+    assert distances == pytest.approx(expected)
+
+
+def test_build_route_total_matches_scalar_legs() -> None:
+    from apps.api.main import build_route
+
+    coords = [(13.7563, 100.5018), (13.7600, 100.5050), (13.7650, 100.5100), (13.7300, 100.5700)]
+    candidates = [{"id": i, "lat": la, "lng": ln} for i, (la, ln) in enumerate(coords, start=1)]
+    route = build_route(candidates, 13.7560, 100.5015)
+    assert route is not None
+    by_id = {c["id"]: c for c in candidates}
+    legs = zip(route["steps"], route["steps"][1:])
+    expected = sum(
+        haversine_distance(by_id[a]["lat"], by_id[a]["lng"], by_id[b]["lat"], by_id[b]["lng"]) for a, b in legs
+    )
+    assert route["steps"][0] == 1
+    assert route["total_distance_m"] == round(expected)
+
+
+def test_place_coords_lookup_matches_to_radians() -> None:
+    from apps.api.geo import PlaceCoords
+
+    places = [{"id": 1, "lat": 13.75, "lng": 100.5}, {"id": 2, "lat": 13.76, "lng": 100.51}]
+    coords = PlaceCoords([(1, 13.75, 100.5)])  # id 2 is converted on the fly
+    assert len(coords) == 1
+    assert coords.lookup(places) == to_radians([13.75, 13.76], [100.5, 100.51])
+
+
+def test_place_coords_lookup_follows_moved_places() -> None:
+    from apps.api.geo import PlaceCoords
+
+    coords = PlaceCoords([(1, 13.75, 100.5)])
+    moved = [{"id": 1, "lat": 13.80, "lng": 100.45}]
+    assert coords.lookup(moved) == to_radians([13.80], [100.45])
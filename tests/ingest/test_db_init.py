@@ -0,0 +1,30 @@
+import sqlite3
+from pathlib import Path
+
+from apps.ingest.db_init import init_clean_db, seed_mock_data
+
+
+def test_init_clean_db_replaces_contentless_fts_table(tmp_path: Path) -> None:
+    db_path = tmp_path / "clean.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE places (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, summary_160 TEXT, tags_json TEXT)")
+        conn.execute("INSERT INTO places (name, summary_160, tags_json) VALUES ('Lumpini Park', 'zebraword', '[]')")
+        conn.execute("CREATE VIRTUAL TABLE fts_places USING FTS5(name, summary_160, tags, content='')")
+
+    init_clean_db(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        ddl = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'fts_places'").fetchone()[0]
+        assert "content=" not in ddl
+        assert conn.execute("SELECT rowid FROM fts_places WHERE fts_places MATCH 'zebraword'").fetchall() == [(1,)]
+
+
+def test_seed_mock_data_aligns_fts_rowids(tmp_path: Path) -> None:
+    db_path = tmp_path / "clean.db"
+    init_clean_db(db_path)
+    seed_mock_data(db_path)
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT rowid, name FROM fts_places ORDER BY rowid").fetchall() == (
+            conn.execute("SELECT id, name FROM places ORDER BY id").fetchall()
+        )
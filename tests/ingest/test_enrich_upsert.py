@@ -0,0 +1,59 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip("requests")
+from apps.ingest.db_init import init_clean_db
+from apps.ingest.enrich.run_enrich import EnrichmentRunner
+
+
+def test_upsert_updates_existing_place_in_place(tmp_path):
+    clean_db = str(tmp_path / "clean.db")
+    init_clean_db(clean_db)
+    runner = EnrichmentRunner(clean_db=clean_db, use_google_maps=False)
+    runner.create_clean_buffer_table()
+
+    def buffer(rating):
+        with sqlite3.connect(clean_db) as conn:
+            conn.execute(
+                "INSERT INTO clean_buffer (name, city, rating) VALUES (?, ?, ?)",
+                ("Sky Bar", "bangkok", rating),
+            )
+
+    buffer(4.1)
+    assert runner.upsert_to_places() == 1
+    buffer(4.6)
+    assert runner.upsert_to_places() == 1
+
+    with sqlite3.connect(clean_db) as conn:
+        rows = conn.execute("SELECT id, rating FROM places WHERE name = 'Sky Bar'").fetchall()
+    assert rows == [(1, 4.6)]
+
+
+def test_upsert_merges_duplicate_names_from_older_databases(tmp_path):
+    clean_db = str(tmp_path / "clean.db")
+    init_clean_db(clean_db)
+    with sqlite3.connect(clean_db) as conn:
+        conn.execute("DROP INDEX idx_places_name")
+        conn.executemany(
+            "INSERT INTO places (name, rating) VALUES (?, ?)",
+            [("Sky Bar", 4.1), ("Lumpini Park", 4.4), ("Sky Bar", 4.3)],
+        )
+        conn.executemany("INSERT INTO embeddings (doc_id, vector, dim) VALUES (?, x'', 0)", [(1,), (2,), (3,)])
+        conn.executemany(
+            "INSERT INTO fts_places (rowid, name, summary_160, tags) VALUES (?, ?, '', '')",
+            [(1, "Sky Bar"), (2, "Lumpini Park"), (3, "Sky Bar")],
+        )
+
+    runner = EnrichmentRunner(clean_db=clean_db, use_google_maps=False)
+    runner.create_clean_buffer_table()
+    assert runner.upsert_to_places() == 0
+
+    with sqlite3.connect(clean_db) as conn:
+        assert conn.execute("SELECT id, name, rating FROM places ORDER BY id").fetchall() == [
+            (2, "Lumpini Park", 4.4),
+            (3, "Sky Bar", 4.3),
+        ]
+        assert conn.execute("SELECT doc_id FROM embeddings ORDER BY doc_id").fetchall() == [(2,), (3,)]
+        assert conn.execute("SELECT rowid FROM fts_places WHERE fts_places MATCH 'sky'").fetchall() == [(3,)]
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_places_name'").fetchone()
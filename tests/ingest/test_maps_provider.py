@@ -0,0 +1,73 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("requests")
+from apps.ingest.enrich.enricher import EnrichmentResult
+from apps.ingest.enrich.providers.maps_stub import GoogleMapsProvider
+
+PAGE = """
+<html><head>
+<script>window.APP_INIT = {"center": {"lat": 13.7465, "lng": 100.5348}};</script>
+</head><body>
+<a href="/maps/place/Sky+Bar/@13.7246,100.4930,17z">Sky Bar</a>
+<div data-cid="cid=12345678901234567890"></div>
+</body></html>
+"""
+
+
+def test_extract_place_data_reads_script_coordinates():
+    place_data = GoogleMapsProvider()._extract_place_data(PAGE, "Sky Bar")
+    assert (place_data["lat"], place_data["lng"]) == (13.7465, 100.5348)
+    assert place_data["hours_json"]
+
+
+def test_extract_first_place_link_prefers_place_id():
+    provider = GoogleMapsProvider()
+    html = PAGE + '<script>{"place_id": "ChIJiW5PNgCf4jARFz9UHGvCjT8"}</script>'
+
+    assert provider._extract_first_place_link(html, "Sky Bar") == (
+        "https://www.google.com/maps/place/?q=place_id:ChIJiW5PNgCf4jARFz9UHGvCjT8"
+    )
+    assert provider._extract_first_place_link(PAGE, "Sky Bar") == (
+        "https://www.google.com/maps/?cid=12345678901234567890"
+    )
+    assert provider._extract_first_place_link("<a href='/@13.7246,100.4930'></a>", "Sky Bar") == (
+        "https://www.google.com/maps/place/Sky+Bar/@13.7246,100.493,17z"
+    )
+
+
+def test_extract_first_place_link_uses_first_place_id_on_page():
+    html = 'place_id:ChIJ11111111111111111111 {"place_id": "ChIJ22222222222222222222"}'
+    assert GoogleMapsProvider()._extract_first_place_link(html, "x") == (
+        "https://www.google.com/maps/place/?q=place_id:ChIJ11111111111111111111"
+    )
+
+
+def test_cached_lookups_survive_a_new_provider(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "gmaps_cache.db")
+    result = EnrichmentResult(rating=4.5, lat=13.7246, lng=100.493, gmap_url="https://maps.google.com/?cid=1")
+    GoogleMapsProvider(cache_path)._cache_put("Sky Bar_bangkok", result)
+
+    provider = GoogleMapsProvider(cache_path)
+    monkeypatch.setattr(provider.session, "get", lambda *a, **kw: pytest.fail("cache miss"))
+    assert provider.enrich("Sky Bar", "", "bangkok") == result
+
+    monkeypatch.setattr(GoogleMapsProvider, "CACHE_TTL_SECONDS", 0)
+    assert GoogleMapsProvider(cache_path)._cache_get("Sky Bar_bangkok") is None
+
+
+def test_request_slots_are_spaced_across_threads(monkeypatch):
+    monkeypatch.setattr(GoogleMapsProvider, "REQUEST_INTERVAL_S", 0.05)
+    provider = GoogleMapsProvider()
+    started = []
+
+    def request(_):
+        provider._wait_for_request_slot()
+        started.append(time.monotonic())
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(request, range(4)))
+    started.sort()
+    assert all(b - a >= 0.045 for a, b in zip(started, started[1:]))
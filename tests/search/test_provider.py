@@ -1,7 +1,11 @@
 import sqlite3
+import threading
 from pathlib import Path
 
-from packages.search.provider import LocalSearchProvider
+import pytest
+
+from packages.search import provider as provider_module
+from packages.search.provider import LocalSearchProvider, reciprocal_rank_fusion
 
 
 def test_knn_returns_deterministic_order(tmp_path: Path) -> None:
@@ -49,3 +53,120 @@ def test_knn_returns_deterministic_order(tmp_path: Path) -> None:
 
     fts_results = provider.fts("tom yum", 5)
     assert len(fts_results) > 0
+
+
+def test_index_many_matches_single_index(tmp_path: Path) -> None:
+    """Bulk indexing should store the same embeddings as per-doc indexing."""
+    single_db = tmp_path / "single.db"
+    bulk_db = tmp_path / "bulk.db"
+    for db_path in (single_db, bulk_db):
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("CREATE VIRTUAL TABLE fts_places USING FTS5 (name, summary_160, tags)")
+            conn.execute("CREATE TABLE embeddings (doc_id INTEGER PRIMARY KEY, vector BLOB, dim INTEGER)")
+
+    docs = [(1, "Tom Yum Goong Master"), (2, "Lumpini Park"), (3, "Sky Bar Bangkok")]
+    single = LocalSearchProvider(str(single_db))
+    for doc_id, text in docs:
+        single.index(doc_id, text)
+    bulk = LocalSearchProvider(str(bulk_db))
+
+    assert bulk.index_many(iter(docs)) == 3
+    assert bulk.knn("sky bar", 3) == single.knn("sky bar", 3)
+    assert bulk.fts("park", 3)
+
+
+def test_search_results_are_memoized_until_reindex(tmp_path: Path) -> None:
+    """Repeated queries are served from memory until the index changes."""
+    db_path = tmp_path / "search.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE VIRTUAL TABLE fts_places USING FTS5 (name, summary_160, tags)")
+        conn.execute("CREATE TABLE embeddings (doc_id INTEGER PRIMARY KEY, vector BLOB, dim INTEGER)")
+
+    provider = LocalSearchProvider(str(db_path))
+    provider.index(1, "Lumpini Park - Central Bangkok green oasis")
+    assert len(provider.fts("park", 5)) == 1
+    assert len(provider.knn("park", 5)) == 1
+
+    provider.index(2, "Benjakitti Park - Lakeside park with a skywalk")
+    assert len(provider.fts("park", 5)) == 2
+    assert len(provider.knn("park", 5)) == 2
+    assert provider._fts_cached.cache_info().hits == 0
+    provider.fts("park", 5)
+    assert provider._fts_cached.cache_info().hits == 1
+
+
+def test_reciprocal_rank_fusion_prefers_ids_found_by_both() -> None:
+    fts = [(1, 0.9), (2, 0.5), (3, 0.1)]
+    knn = [(4, 0.8), (2, 0.7)]
+    assert reciprocal_rank_fusion(fts, knn) == [2, 1, 4, 3]
+    assert reciprocal_rank_fusion(fts, knn, limit=2) == [2, 1]
+    assert reciprocal_rank_fusion([], []) == []
+
+
+def test_fts_rowids_match_document_ids(tmp_path: Path) -> None:
+    """FTS hits are reported under the id the document was indexed with."""
+    db_path = tmp_path / "search.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE VIRTUAL TABLE fts_places USING FTS5 (name, summary_160, tags)")
+        conn.execute("CREATE TABLE embeddings (doc_id INTEGER PRIMARY KEY, vector BLOB, dim INTEGER)")
+
+    provider = LocalSearchProvider(str(db_path))
+    assert provider.index_many([(7, "Lumpini Park"), (42, "Sky Bar Bangkok")]) == 2
+    provider.index(99, "Benjakitti Park")
+    assert sorted(doc_id for doc_id, _ in provider.fts("park", 5)) == [7, 99]
+    assert [doc_id for doc_id, _ in provider.fts("sky", 5)] == [42]
+
+
+def test_reindex_replaces_old_terms(tmp_path: Path) -> None:
+    """Re-indexing a document removes the terms it was indexed with before."""
+    db_path = tmp_path / "search.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE VIRTUAL TABLE fts_places USING FTS5 (name, summary_160, tags)")
+        conn.execute("CREATE TABLE embeddings (doc_id INTEGER PRIMARY KEY, vector BLOB, dim INTEGER)")
+
+    provider = LocalSearchProvider(str(db_path))
+    provider.index(1, "zebraword")
+    provider.index(1, "giraffeword")
+    provider.index_many([(2, "zebraword"), (2, "lionword")])
+    assert provider.fts("zebraword", 5) == []
+    assert [doc_id for doc_id, _ in provider.fts("giraffeword", 5)] == [1]
+    assert [doc_id for doc_id, _ in provider.fts("lionword", 5)] == [2]
+
+
+def test_search_results_expire_after_ttl(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """An index written by another process is seen once the memo expires."""
+    db_path = tmp_path / "search.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE VIRTUAL TABLE fts_places USING FTS5 (name, summary_160, tags)")
+        conn.execute("CREATE TABLE embeddings (doc_id INTEGER PRIMARY KEY, vector BLOB, dim INTEGER)")
+
+    now = 1000.0
+    monkeypatch.setattr(provider_module.time, "monotonic", lambda: now)
+    api = LocalSearchProvider(str(db_path))
+    LocalSearchProvider(str(db_path)).index(1, "Lumpini Park")
+    assert len(api.fts("park", 5)) == len(api.knn("park", 5)) == 1
+
+    LocalSearchProvider(str(db_path)).index(2, "Benjakitti Park")
+    assert len(api.fts("park", 5)) == len(api.knn("park", 5)) == 1
+
+    now += LocalSearchProvider.SEARCH_CACHE_TTL_S
+    assert len(api.fts("park", 5)) == len(api.knn("park", 5)) == 2
+
+
+def test_close_closes_every_thread_connection(tmp_path: Path) -> None:
+    db_path = tmp_path / "search.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE VIRTUAL TABLE fts_places USING FTS5 (name, summary_160, tags)")
+
+    provider = LocalSearchProvider(str(db_path))
+    conns = [provider._connect()]
+    thread = threading.Thread(target=lambda: conns.append(provider._connect()))
+    thread.start()
+    thread.join()
+    assert conns[0] is not conns[1]
+
+    provider.close()
+    for conn in conns:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    assert provider.fts("park", 5) == []